@@ -17,7 +17,10 @@ Andrea Del Cortona
 #==================================================================#
 
 import argparse
+import bisect
 import functools
+import collections
+import heapq
 import os
 import re
 import shutil
@@ -25,6 +28,7 @@ import string
 import sys
 import itertools
 import operator
+from array import array
 from datetime import datetime
 
 
@@ -40,23 +44,50 @@ deletion	x1156_PM_chrIV:2001-17000	15000	0.00848363	1.06248e-11	0	1.22594e-11	0
 deletion	x1156_PM_chrIV:44001-82000	38000	0.0501951	4.19401e-12	0	4.42701e-12	0	1
 
 	usage:
-	python3.5 CNVnator_merger.py --input_1 CNVnator_bin1 --input_2 CNVnator_bin2 --sample sample_name > CNV_merged.tab''')
+	python3.5 CNVnator_merger.py --input_1 CNVnator_bin1 --input_2 CNVnator_bin2 --sample sample_name > CNV_merged.tab
+
+With --inputs, any number of CNVnator files (e.g.: 100 bp, 500 bp and 1000 bp bins) are merged in a single pass.
+The files are read chromosome by chromosome, only the calls of the current chromosome
+(and of the ones read ahead when a chromosome is missing from a file) are kept in memory.
+As in CNVnator outputs, each file must list a chromosome in one block, and the files must list the chromosomes in the same order
+(a chromosome can be missing from a file).
+Consensus intervals are the regions covered by significant calls in at least --min_support inputs (default: all):
+adjacent regions with enough support and the same kind are joined in one interval.
+The output columns are: sample, chromosome, start, stop, kind ("discordant" if the calls disagree), mean normalized RD,
+then normalized RD and e-value of the most significant call of each input in the interval, in the order given
+("NA" if the input has no call there).
+
+	usage:
+	python3.5 CNVnator_merger.py --inputs CNVnator_bin100 CNVnator_bin500 CNVnator_bin1000 --sample sample_name > CNV_merged.tab''')
 
 parser.add_argument("--input_1",
 	metavar ='INPUT_1',
 	action = 'store',
 	type = str,
 	dest = 'INPUT_1',
-	help = 'CNVnator output with bin1.',
-	required = True)
+	help = 'CNVnator output with bin1.')
 	
 parser.add_argument("--input_2",
 	metavar ='INPUT_2',
 	action = 'store',
 	type = str,
 	dest = 'INPUT_2',
-	help = 'CNVnator output with bin2.',
-	required = True)
+	help = 'CNVnator output with bin2.')
+	
+parser.add_argument("--inputs",
+	metavar ='INPUTS',
+	action = 'store',
+	type = str,
+	nargs = '+',
+	dest = 'INPUTS',
+	help = 'CNVnator outputs with any number of bins, merged together (replaces --input_1 and --input_2).')
+
+parser.add_argument("--min_support",
+	metavar ='MIN_SUPPORT',
+	action = 'store',
+	type = int,
+	dest = 'MIN_SUPPORT',
+	help = 'Minimum number of inputs with a significant call to report a consensus interval (default: all the --inputs).')
 	
 parser.add_argument("--sample",
 	metavar ='SAMPLE',
@@ -68,6 +99,9 @@ parser.add_argument("--sample",
 
 args = parser.parse_args()
 
+if args.INPUTS is None and (args.INPUT_1 is None or args.INPUT_2 is None):
+	parser.error('either --input_1 and --input_2, or --inputs are required')
+
 
 
 #==================================================================#
@@ -77,6 +111,11 @@ args = parser.parse_args()
 # read the input table and print the output
 def main():
 
+	# merge any number of bins together
+	if args.INPUTS is not None:
+		multi_merge(args.INPUTS, args.SAMPLE, args.MIN_SUPPORT)
+		return()
+
 	# load databases
 	with open(args.INPUT_1) as infile:
  		INPUT_1_DB = read_table(infile)
@@ -87,31 +126,293 @@ def main():
 	# check positions, chromosome by chromosome. Print overlaps
 	for KEY in INPUT_1_DB:
 		if KEY in INPUT_2_DB:
-			POS_1 = []
-			POS_2 = []
-			for k in range(len(INPUT_1_DB[KEY])):
-				POS_1.append(INPUT_1_DB[KEY][k][0:2])									# here I save the positions of each record
-			for k in range(len(INPUT_2_DB[KEY])):
-				POS_2.append(INPUT_2_DB[KEY][k][0:2])									# here I save the positions of each record
+			POS_1 = parse_positions(INPUT_1_DB[KEY])							# here I save the positions of each record, as integers
+			INDEX_2 = build_index(INPUT_2_DB[KEY])								# sorted interval index of window 2
 			
 			# iterate through positions and find overlapping regions
-			for k in range(len(POS_1)):													# window 1
-				for j in range(len(POS_2)):												# window 2
-					if int(POS_1[k][1]) < int(POS_2[j][0]):								# window 1 < window 2
-						continue
-					elif int(POS_1[k][0]) > int(POS_2[j][1]):							# window 1 > window 2
-						continue
-					else:																# the windows overlap
-						if int(POS_1[k][0]) <= int(POS_2[j][0]):
-							if int(POS_1[k][1]) <= int(POS_2[j][1]):
-								virtual_printer(args.SAMPLE, KEY, POS_2[j][0], POS_1[k][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
-							else:
-								virtual_printer(args.SAMPLE, KEY, POS_2[j][0], POS_2[j][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
+			for k in range(len(INPUT_1_DB[KEY])):										# window 1
+				START_1 = POS_1[0][k]
+				STOP_1 = POS_1[1][k]
+				for j in query_index(INDEX_2, START_1, STOP_1):							# overlapping windows 2
+					START_2 = INDEX_2[2][j]
+					STOP_2 = INDEX_2[3][j]
+					if START_1 <= START_2:
+						if STOP_1 <= STOP_2:
+							virtual_printer(args.SAMPLE, KEY, INPUT_2_DB[KEY][j][0], INPUT_1_DB[KEY][k][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
+						else:
+							virtual_printer(args.SAMPLE, KEY, INPUT_2_DB[KEY][j][0], INPUT_2_DB[KEY][j][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
+					else:
+						if STOP_1 <= STOP_2:
+							virtual_printer(args.SAMPLE, KEY, INPUT_1_DB[KEY][k][0], INPUT_1_DB[KEY][k][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
 						else:
-							if int(POS_1[k][1]) <= int(POS_2[j][1]):
-								virtual_printer(args.SAMPLE, KEY, POS_1[k][0], POS_1[k][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
-							else:
-								virtual_printer(args.SAMPLE, KEY, POS_1[k][0], POS_2[j][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
+							virtual_printer(args.SAMPLE, KEY, INPUT_1_DB[KEY][k][0], INPUT_2_DB[KEY][j][1], INPUT_1_DB[KEY][k][2], INPUT_1_DB[KEY][k][3], INPUT_2_DB[KEY][j][3])
+
+
+
+# parse the coordinates of a list of records once, as integer arrays
+def parse_positions(RECORDS):
+
+	STARTS = array('q', [int(RECORD[0]) for RECORD in RECORDS])
+	STOPS = array('q', [int(RECORD[1]) for RECORD in RECORDS])
+	
+	return(STARTS, STOPS)
+
+
+
+# build a sorted interval index over a list of records:
+# record order sorted by start, sorted starts, starts and stops in file order,
+# running maximum of the stops along the sorted order
+def build_index(RECORDS):
+
+	STARTS, STOPS = parse_positions(RECORDS)
+	ORDER = sorted(range(len(RECORDS)), key = lambda j: STARTS[j])
+	SORTED_STARTS = array('q', [STARTS[j] for j in ORDER])
+	MAX_STOPS = array('q')
+	MAX_STOP = None
+	for j in ORDER:
+		if MAX_STOP is None or STOPS[j] > MAX_STOP:
+			MAX_STOP = STOPS[j]
+		MAX_STOPS.append(MAX_STOP)
+	
+	return(ORDER, SORTED_STARTS, STARTS, STOPS, MAX_STOPS)
+
+
+
+# return the file order of all the indexed records overlapping START-STOP
+def query_index(INDEX, START, STOP):
+
+	ORDER, SORTED_STARTS, STARTS, STOPS, MAX_STOPS = INDEX
+	HITS = []
+	# records starting after STOP cannot overlap, walk back until no stop can reach START
+	i = bisect.bisect_right(SORTED_STARTS, STOP) - 1
+	while i >= 0 and MAX_STOPS[i] >= START:
+		if STOPS[ORDER[i]] >= START:
+			HITS.append(ORDER[i])
+		i -= 1
+	HITS.sort()
+	
+	return(HITS)
+
+
+
+# merge the significant calls of any number of inputs and print the consensus intervals
+def multi_merge(INPUTS, SAMPLE, MIN_SUPPORT):
+
+	if MIN_SUPPORT is None:
+		MIN_SUPPORT = len(INPUTS)
+
+	# k-way merge of the calls sorted by start, chromosome by chromosome
+	for CHR, GROUPS in chromosome_groups(INPUTS):
+		STREAMS = [sorted_calls(RECORDS, i) for i, RECORDS in enumerate(GROUPS)]
+		SEGMENTS = sweep_calls(heapq.merge(*STREAMS))
+		for INTERVAL in merge_segments(SEGMENTS, len(INPUTS), MIN_SUPPORT):
+			consensus_printer(SAMPLE, CHR, INTERVAL)
+
+
+
+# yield the significant calls of an input file, one chromosome at a time
+def read_chromosomes(INPUT):
+
+	with open(INPUT) as infile:
+		CALLS = filter(None, (parse_call(line) for line in infile))
+		for CHR, GROUP in itertools.groupby(CALLS, key = operator.itemgetter(0)):
+			yield(CHR, [CALL[1] for CALL in GROUP])
+
+
+
+# yield each chromosome with the calls of each input on it ([] if none), reading the inputs in step.
+# When the inputs are on different chromosomes, I read ahead until their order is known:
+# a chromosome is processed once all the others at the head of an input are known to come after it
+def chromosome_groups(INPUTS):
+
+	READERS = [read_chromosomes(INPUT) for INPUT in INPUTS]
+	QUEUES = [collections.deque() for INPUT in INPUTS]						# chromosomes read and not yet processed
+	EXHAUSTED = [False for INPUT in INPUTS]
+	SEEN = [set() for INPUT in INPUTS]
+	LAST = [None for INPUT in INPUTS]
+	FOLLOWS = {}															# chromosome -> chromosomes right after it in an input
+	DONE = set()
+
+	# read the next chromosome of an input
+	def read_ahead(i):
+		for CHR, RECORDS in READERS[i]:
+			if CHR in SEEN[i]:
+				sys.stderr.write("# ERROR: %s lists the chromosome %s in more than one block\n" % (INPUTS[i], CHR))
+				sys.exit(1)
+			SEEN[i].add(CHR)
+			if LAST[i] is not None:
+				FOLLOWS.setdefault(LAST[i], set()).add(CHR)
+			LAST[i] = CHR
+			QUEUES[i].append((CHR, RECORDS))
+			return(True)
+		EXHAUSTED[i] = True
+		return(False)
+
+	while True:
+		for i in range(len(INPUTS)):
+			if not QUEUES[i] and not EXHAUSTED[i]:
+				read_ahead(i)
+		HEADS = []
+		for i in range(len(INPUTS)):
+			if QUEUES[i] and QUEUES[i][0][0] not in HEADS:
+				HEADS.append(QUEUES[i][0][0])
+		if not HEADS:
+			return
+
+		# the first chromosome known to come before all the other heads
+		CHR = None
+		for HEAD in HEADS:
+			if all([precedes(FOLLOWS, HEAD, OTHER) for OTHER in HEADS if OTHER != HEAD]):
+				CHR = HEAD
+				break
+		if CHR is None:
+			OPEN = [i for i in range(len(INPUTS)) if not EXHAUSTED[i]]
+			if OPEN:
+				read_ahead(min(OPEN, key = lambda i: len(QUEUES[i])))
+				continue
+			# all read: the first head that no other head is known to come before
+			for HEAD in HEADS:
+				if not any([precedes(FOLLOWS, OTHER, HEAD) for OTHER in HEADS if OTHER != HEAD]):
+					CHR = HEAD
+					break
+
+		if CHR is None or CHR in DONE:
+			sys.stderr.write("# ERROR: the inputs do not list the chromosomes in the same order (%s)\n" % ', '.join(HEADS))
+			sys.exit(1)
+		DONE.add(CHR)
+		GROUPS = []
+		for i in range(len(INPUTS)):
+			if QUEUES[i] and QUEUES[i][0][0] == CHR:
+				GROUPS.append(QUEUES[i].popleft()[1])
+			else:
+				GROUPS.append([])
+		yield(CHR, GROUPS)
+
+
+
+# tell if the chromosome FIRST is listed before SECOND in the inputs read so far
+def precedes(FOLLOWS, FIRST, SECOND):
+
+	STACK = [FIRST]
+	VISITED = set(STACK)
+	while STACK:
+		for CHR in FOLLOWS.get(STACK.pop(), ()):
+			if CHR == SECOND:
+				return(True)
+			if CHR not in VISITED:
+				VISITED.add(CHR)
+				STACK.append(CHR)
+
+	return(False)
+
+
+
+# yield the calls of one input on one chromosome, sorted by start
+def sorted_calls(RECORDS, INPUT_ID):
+
+	STARTS, STOPS = parse_positions(RECORDS)
+	for j in sorted(range(len(RECORDS)), key = lambda j: STARTS[j]):
+		yield(STARTS[j], STOPS[j], INPUT_ID, RECORDS[j])
+
+
+
+# sweep the merged calls and yield the segments where the set of overlapping calls does not change,
+# only the calls overlapping the current position are kept in memory
+def sweep_calls(CALLS):
+
+	ACTIVE = []																	# heap of (STOP, n, INPUT_ID, RECORD)
+	CURRENT = None																# first position of the current segment
+	n = 0
+	for START, STOP, INPUT_ID, RECORD in CALLS:
+		# close the segments ending before this call
+		while ACTIVE and ACTIVE[0][0] < START:
+			END = ACTIVE[0][0]
+			if CURRENT <= END:
+				yield(CURRENT, END, ACTIVE)
+			while ACTIVE and ACTIVE[0][0] == END:
+				heapq.heappop(ACTIVE)
+			CURRENT = END + 1
+		# close the segment before this call
+		if ACTIVE and CURRENT < START:
+			yield(CURRENT, START - 1, ACTIVE)
+		heapq.heappush(ACTIVE, (STOP, n, INPUT_ID, RECORD))
+		CURRENT = START
+		n += 1
+
+	# close the remaining segments
+	while ACTIVE:
+		END = ACTIVE[0][0]
+		if CURRENT <= END:
+			yield(CURRENT, END, ACTIVE)
+		while ACTIVE and ACTIVE[0][0] == END:
+			heapq.heappop(ACTIVE)
+		CURRENT = END + 1
+
+
+
+# most significant call of each input among the calls of a segment
+def best_calls(ACTIVE, N_INPUTS):
+
+	BEST = [None for x in range(N_INPUTS)]
+	for CALL in ACTIVE:
+		INPUT_ID, RECORD = CALL[2], CALL[3]
+		if BEST[INPUT_ID] is None or float(RECORD[4]) < float(BEST[INPUT_ID][4]):
+			BEST[INPUT_ID] = RECORD
+
+	return(BEST)
+
+
+
+# kind of the calls of a segment, "discordant" if they disagree
+def segment_kind(BEST):
+
+	KINDS = set([RECORD[2] for RECORD in BEST if RECORD is not None])
+
+	return(KINDS.pop() if len(KINDS) == 1 else "discordant")
+
+
+
+# join the adjacent segments supported by at least MIN_SUPPORT inputs and of the same kind,
+# keep the most significant call of each input over the joined segments
+def merge_segments(SEGMENTS, N_INPUTS, MIN_SUPPORT):
+
+	INTERVAL = None																# [START, STOP, KIND, BEST]
+	for START, STOP, ACTIVE in SEGMENTS:
+		BEST = best_calls(ACTIVE, N_INPUTS)
+		if len([RECORD for RECORD in BEST if RECORD is not None]) < MIN_SUPPORT:
+			if INTERVAL is not None:
+				yield(INTERVAL)
+				INTERVAL = None
+			continue
+		KIND = segment_kind(BEST)
+		if INTERVAL is not None and INTERVAL[1] + 1 == START and INTERVAL[2] == KIND:
+			INTERVAL[1] = STOP
+			for i in range(N_INPUTS):
+				if BEST[i] is not None and (INTERVAL[3][i] is None or float(BEST[i][4]) < float(INTERVAL[3][i][4])):
+					INTERVAL[3][i] = BEST[i]
+		else:
+			if INTERVAL is not None:
+				yield(INTERVAL)
+			INTERVAL = [START, STOP, KIND, BEST]
+	if INTERVAL is not None:
+		yield(INTERVAL)
+
+
+
+# print a consensus interval with the normalized RD and e-value of each input
+def consensus_printer(SAMPLE, CHR, INTERVAL):
+	START, STOP, KIND, BEST = INTERVAL
+
+	SUPPORT = [RECORD for RECORD in BEST if RECORD is not None]
+	MEAN_RD = sum([float(RECORD[3]) for RECORD in SUPPORT])/len(SUPPORT)
+	PER_BIN = []
+	for RECORD in BEST:
+		if RECORD is None:
+			PER_BIN.extend(["NA", "NA"])
+		else:
+			PER_BIN.extend([RECORD[3], RECORD[4]])
+	print('\t'.join([SAMPLE, CHR, str(START), str(STOP), KIND, str(MEAN_RD)] + PER_BIN))
+	return()
 
 
 
@@ -121,18 +422,29 @@ def read_table(infile):
 	IN_DB = {}
 
 	for line in infile:
-		line = line.rstrip('\n')
-		KIND, LOCUS, LENGTH, NORM_RD, EVAL1, EVAL2, EVAL3, EVAL4, QUAL = line.split('\t')
-		CHR, COHORD = LOCUS.split(':')
-		START, STOP = COHORD.split('-')
-		
-		if float(EVAL1) < 0.05:
+		CALL = parse_call(line)
+		if CALL is not None:
+			CHR, RECORD = CALL
 			if CHR in IN_DB:
-				IN_DB[CHR].append([START, STOP, KIND, NORM_RD, EVAL1])
+				IN_DB[CHR].append(RECORD)
 			else:
-				IN_DB[CHR] = [[START, STOP, KIND, NORM_RD, EVAL1]]
+				IN_DB[CHR] = [RECORD]
 	
 	return(IN_DB)
+
+
+
+# parse a line of CNVnator output, return the chromosome and the call if significant, otherwise None
+def parse_call(line):
+
+	line = line.rstrip('\n')
+	KIND, LOCUS, LENGTH, NORM_RD, EVAL1, EVAL2, EVAL3, EVAL4, QUAL = line.split('\t')
+	CHR, COHORD = LOCUS.split(':')
+	START, STOP = COHORD.split('-')
+	
+	if float(EVAL1) < 0.05:
+		return(CHR, [START, STOP, KIND, NORM_RD, EVAL1])
+	return(None)
 	
 	
 
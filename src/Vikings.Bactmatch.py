@@ -27,6 +27,7 @@ import sys
 import itertools
 import operator
 from datetime import datetime
+from vikingslib import hgt
 
 
 
@@ -44,7 +45,13 @@ scaffold70|size63194	Voss100003602-RA	match
 scaffold70|size63194	Voss100003603-RA	[]
 
 	usage:
-	python3.5 Vikings.Bactmatch.py --input > bacterialgenes.txt''')
+	python3.5 Vikings.Bactmatch.py --input > bacterialgenes.txt
+
+The input is streamed: with --flank N, a match is kept if one of the N rows before or after it,
+on the same contig, is ['Eukaryota']. Only 2N+1 rows are kept in memory.
+
+	usage:
+	python3.5 Vikings.Bactmatch.py --input --flank 3 > bacterialgenes.txt''')
 
 parser.add_argument("--input",
 	metavar ='INPUT',
@@ -54,6 +61,14 @@ parser.add_argument("--input",
 	help = 'The output of check_eukbact_contigs.1.py script.',
 	required = True)
 
+parser.add_argument("--flank",
+	metavar ='FLANK',
+	action = 'store',
+	type = int,
+	dest = 'FLANK',
+	help = 'Number of rows on each side checked for a eukaryotic gene (default: 1).',
+	default = 1)
+
 args = parser.parse_args()
 
 
@@ -65,22 +80,22 @@ args = parser.parse_args()
 # read the input table and print the output
 def main():
 
-	# import input file
-	with open(args.INPUT) as infile:
+	# discover bacterial positions surrounded by eukaryotic genes, within a window of rows on the same contig
+	for ROW, NEIGHBOURS in hgt.flank_windows(read_rows(args.INPUT), args.FLANK):
+		if ROW[2] == "match":
+			if any(NEIGHBOUR[2] == hgt.EUKARYOTA for NEIGHBOUR in NEIGHBOURS):
+				print('\t'.join(ROW))
 
-		INPUT_DB = []
+
+
+# stream the rows of the input table
+def read_rows(INPUT):
+
+	with open(INPUT) as infile:
 		for line in infile:
 			line = line.rstrip('\n')
 			CHR, GENE, FEAT = line.split('\t')
-			INPUT_DB.append([CHR, GENE, FEAT])
-	
-	# discover bacterial positions surrounded by eukaryotic genes
-	for k in range(len(INPUT_DB)):
-		if INPUT_DB[k][2] == "match":
-			if INPUT_DB[k][0] == INPUT_DB[k-1][0] and INPUT_DB[k-1][2] == "['Eukaryota']":
-				print('\t'.join(INPUT_DB[k]))	
-			elif INPUT_DB[k][0] == INPUT_DB[k+1][0] and INPUT_DB[k+1][2] == "['Eukaryota']":
-				print('\t'.join(INPUT_DB[k])) 
+			yield([CHR, GENE, FEAT])
 
 
 	
@@ -93,4 +108,4 @@ if __name__ == '__main__':
 	t0 = datetime.now()
 	main()
 	dt = datetime.now() - t0
-sys.stderr.write( "# Time elapsed: %s\n" % dt )
+	sys.stderr.write( "# Time elapsed: %s\n" % dt )
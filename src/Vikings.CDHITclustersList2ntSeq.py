@@ -21,8 +21,11 @@ import shutil
 import string
 import sys
 import itertools
+import multiprocessing
 import operator
 from datetime import datetime
+from vikingslib import archive
+from vikingslib import fasta
 
 
 
@@ -35,6 +38,19 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 	==================================================================
 	I take a fasta file with nucleotide sequences and a folder with list of genes headers.
 	I return a fasta file for each of the file in the folder with the corresponding sequences.
+	The fasta is indexed once (samtools faidx compatible all_plusKV.nt.fa.fai) and the sequences
+	are read from the memory-mapped fasta, it is not loaded in memory.
+	With --jobs the gene lists are processed in parallel, each worker maps the same fasta
+	(the pages are shared by the OS), and the missing sequences are reported together at the end.
+	The input directory can also be a packed archive of gene lists (Vikings.filterCDHITclusters.nt.py --packed),
+	and with --packed the fasta files are written in one archive OUTDIR (+ OUTDIR.idx) instead of a directory.
+	Each worker writes its own fasta files to OUTDIR, with --packed they are sent to the main process
+	that writes the archive.
+	A fasta that cannot be indexed, or whose index cannot be written next to it (read-only directory),
+	is read in memory once, before the workers are forked, and the workers share it
+	(--jobs > 1 then needs the fork start method, i.e. Linux or macOS).
+	A sequence is named by its header up to the first white space (samtools faidx), not by the whole
+	header: a gene list naming a sequence by a header with spaces reports it as missing.
 	
 	__________________________________________________________________
 	
@@ -53,6 +69,8 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 	
 	Usage:
 	python3.6 Vikings.CDHITclustersList2ntSeq.py --fasta all_plusKV.nt.fa --indir ./01_filter_clusters/02_clusters_311-350_noDuplicates/ --outdir ./03_nt_clusters/
+	python3.6 Vikings.CDHITclustersList2ntSeq.py --fasta all_plusKV.nt.fa --indir ./01_filter_clusters/02_clusters_311-350_noDuplicates/ --outdir ./03_nt_clusters/ --jobs 8 --report missing.tsv
+	python3.6 Vikings.CDHITclustersList2ntSeq.py --fasta all_plusKV.nt.fa --indir all_plusKV.nt.098.fa.clstr.fltr.clstr --outdir 03_nt_clusters.pack --packed
 	
 	==================================================================
 	''',
@@ -65,15 +83,28 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 
 parser.add_argument("--fasta", metavar ='FASTA', action = 'store',
 	type = str, dest = 'FASTA', required = True,
-	help = 'The all_plusKV.nt.fa sequence file with all the nucleotidic sequences.')
+	help = 'The all_plusKV.nt.fa sequence file with all the nucleotidic sequences. '
+	'As in samtools faidx, a sequence is named by its header up to the first white space '
+	'(not by the whole header), the gene lists must use these names.')
 
 parser.add_argument("--indir", metavar ='INDIR', action = 'store',
 	type = str, dest = 'INDIR', required = True,
-	help = 'The directory with all the deduplicated list of genes for each cluset.')
+	help = 'The directory (or packed archive) with all the deduplicated list of genes for each cluset.')
 
 parser.add_argument("--outdir", metavar ='OUTDIR', action = 'store',
 	type = str, dest = 'OUTDIR', required = True,
 	help = 'The output directory where to write all the output fasta files.')
+
+parser.add_argument("--jobs", metavar ='JOBS', action = 'store',
+	type = int, dest = 'JOBS', default = 1,
+	help = 'Number of gene lists processed in parallel (default: 1).')
+
+parser.add_argument("--report", metavar ='REPORT', action = 'store',
+	type = str, dest = 'REPORT', default = None,
+	help = 'Write the missing sequences to this tab separated file (list file, gene).')
+
+parser.add_argument("--packed", action = 'store_true', dest = 'PACKED',
+	help = 'Write the fasta files in one packed archive OUTDIR, with its index OUTDIR.idx.')
 	
 args = parser.parse_args()
 
@@ -85,80 +116,118 @@ args = parser.parse_args()
 # main function
 def main():
 	'''
-	I read the fasta file.
+	I open the indexed fasta file.
 	I iterate through the input directory.
 	I restrieve fasta sequences for each gene list file in the input directory.
 	I write selected fasta sequences to output directory.
 	'''
 
-	# read input datasets
-	fastaDB = read_fasta(args.FASTA)
+	# index (once) and map the input fasta
+	fastaDB = fasta.open_fasta(args.FASTA)
+	if fastaDB["error"] is not None:
+		sys.stderr.write( "\n# WARNING: %s, the fasta is read in memory \n" % fastaDB["error"])
 	
 	# read all list files in input dir
-	process_list(args.INDIR, fastaDB)
+	missing = process_list(args.INDIR, fastaDB, args.JOBS)
 
+	# report the missing sequences of all the lists
+	for filename, Gene in missing:
+		sys.stderr.write( "\n# WARNING: the sequence %s is missing from %s \n" % (Gene, filename))
+	if args.REPORT is not None:
+		with open(args.REPORT, 'w') as oF:
+			for filename, Gene in missing:
+				oF.write(filename + '\t' + Gene + '\n')
 
 
-def read_fasta(fasta):
+
+def process_list(indir, fastaDB, jobs = 1):
 	'''
-	I read an input fasta file.
-	I return a dictionary of sequences.
+	I iterate through the input directory, in parallel with more than one job.
+	I return the missing sequences of all the gene lists, in directory order.
+	'''
+
+	listDB = archive.open_input(indir)
+	outDB = archive.open_output(args.OUTDIR, args.PACKED)
+	missing = []
+	if jobs > 1:
+		# a fasta read in memory is handed to forked workers, which inherit it instead of reading it again
+		context = multiprocessing
+		sharedDB = None
+		if fastaDB["sequences"] is not None:
+			if 'fork' not in multiprocessing.get_all_start_methods():
+				sys.stderr.write( "\n# ERROR: the fasta is read in memory and cannot be shared by the workers on this platform, run with --jobs 1 \n")
+				sys.exit(1)
+			context = multiprocessing.get_context('fork')
+			sharedDB = fastaDB
+		with context.Pool(jobs, initializer = init_worker, initargs = (args.FASTA, indir, args.OUTDIR, args.PACKED, sharedDB)) as pool:
+			for filename, seqFasta, result in pool.imap(process_worker, listDB["names"], chunksize = 16):
+				# only the archive is written here, the workers write the directory output
+				if seqFasta is not None:
+					archive.write(outDB, filename + '.fa', seqFasta)
+				missing.extend(result)
+	else:
+		for filename in listDB["names"]:
+			filename, seqFasta, result = process_file(listDB, filename, fastaDB)
+			archive.write(outDB, filename + '.fa', seqFasta)
+			missing.extend(result)
+	archive.close_output(outDB)
+
+	return(missing)
+
+
+
+def init_worker(fasta_file, indir, outdir, packed, sharedDB):
+	'''
+	I map the indexed fasta and open the gene lists once in each worker.
+	A fasta read in memory by the main process (sharedDB) is used as it is.
+	I open the output directory, unless the output is packed (written by the main process).
 	'''
-	
-	# declare output dictionary
-	fastaDB = {}
-
-	# import clstr file
-	with open(fasta) as infile:
-		lastSeq = ''
-		for line in infile:
-			line = line.rstrip('\n')
-			# is it an header?
-			if line[0] == ">":
-				header = line[1:]
-				lastSeq = header
-				fastaDB[header] = ''
-			# is sequence
-			else:
-				fastaDB[lastSeq] = fastaDB[lastSeq] + line
-
-	return(fastaDB)
 
+	global workerDB, workerLists, workerOut
+	workerDB = sharedDB if sharedDB is not None else fasta.open_fasta(fasta_file)
+	workerLists = archive.open_input(indir)
+	workerOut = None if packed else archive.open_output(outdir)
 
-	
-def process_list(indir, fastaDB):
+
+
+def process_worker(filename):
 	'''
-	I iterate through the input directory.
-	I restrieve fasta sequences for each gene list file in the input directory.
-	I write selected fasta sequences to output directory..
+	I process a gene list in a worker and write its fasta file to the output directory.
+	With a packed output, I return the fasta text instead.
+	'''
+
+	filename, seqFasta, missing = process_file(workerLists, filename, workerDB)
+	if workerOut is not None:
+		archive.write(workerOut, filename + '.fa', seqFasta)
+		seqFasta = None
+
+	return(filename, seqFasta, missing)
+
+
+
+def process_file(listDB, filename, fastaDB):
+	'''
+	I restrieve fasta sequences for a gene list file of the input directory.
+	I return the list file, its fasta text and the missing sequences as [list file, gene].
 	'''
 	
-	# iterate through the input directory
-	for filename in os.listdir(indir):
-	
-		# read list of gene headers
-		with open('%s/%s' % (indir, filename)) as infile:
-			GeneList = []
-			for line in infile:
-				line = line.rstrip('\n')
-				GeneList.append(line)
-				
-		# retrieve fasta seq
-		seqDB = {}
-		for Gene in GeneList:
-			if Gene in fastaDB:
-				seqDB[Gene] = ''.join(fastaDB[Gene])
-			else:
-				sys.stderr.write( "\n# WARNING: the sequence %s is missing from %s \n" % (Gene, filename))
-		
-		# write fasta to file	
-		outfile = filename + '.fa'
-		with open('%s/%s' % (args.OUTDIR, outfile), 'w') as oF:
-			for seq in seqDB:
-				oF.write('>' + seq + '\n')
-				oF.write(seqDB[seq] + '\n')
-		oF.close()
+	# read list of gene headers
+	GeneList = archive.read_lines(listDB, filename)
+			
+	# retrieve fasta seq
+	seqDB = {}
+	missing = []
+	for Gene in GeneList:
+		if Gene in fastaDB["index"]:
+			seqDB[Gene] = fasta.fetch(fastaDB, Gene)
+		else:
+			missing.append([filename, Gene])
 	
+	# fasta text of the list
+	seqFasta = ''.join(['>' + seq + '\n' + seqDB[seq] + '\n' for seq in seqDB])
+
+	return(filename, seqFasta, missing)
+
 
 
 #------------------------------------------------------------------#
@@ -169,4 +238,4 @@ if __name__ == '__main__':
 	t0 = datetime.now()
 	main()
 	dt = datetime.now() - t0
-sys.stderr.write( "# Time elapsed: %s\n" % dt )
+	sys.stderr.write( "# Time elapsed: %s\n" % dt )
@@ -25,6 +25,7 @@ import sys
 import itertools
 import operator
 from datetime import datetime
+from vikingslib import archive
 
 
 
@@ -39,11 +40,14 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 	I identify S288C gene name.
 	I look into a folder of fasta files with Hittigner genes.
 	I identify Skud & Spar corresponding headers and add them to the gene list.
+	The gene lists and the Hittinger folder can be packed archives (see vikingslib/archive.py),
+	and with --packed the output lists are written in one archive OUTDIR (+ OUTDIR.idx).
 	
 	__________________________________________________________________
 	
 	Usage:
 	python3.6 Vikings.addHittingerID.py --CDlists 01_nt_clusters_lst_select --Hit 99_Hittinger/geneList/ --outdir 02_nt_clusters_lst_select_Hittinger
+	python3.6 Vikings.addHittingerID.py --CDlists 01_nt_clusters_lst_select.pack --Hit 99_Hittinger/geneList/ --outdir 02_nt_clusters_lst_select_Hittinger.pack --packed
 	
 	==================================================================
 	''',
@@ -56,15 +60,18 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 
 parser.add_argument("--CDlists", metavar ='CDlists', action = 'store',
 	type = str, dest = 'CDlists', required = True,
-	help = 'Folder with gene ID list generated with Vikings.filterCDHITclusters.nt.py.')
+	help = 'Folder (or packed archive) with gene ID list generated with Vikings.filterCDHITclusters.nt.py.')
 
 parser.add_argument("--Hit", metavar ='Hit', action = 'store',
 	type = str, dest = 'Hit', required = True,
-	help = 'The folder with Hittinger gene IDs.')
+	help = 'The folder (or packed archive) with Hittinger gene IDs.')
 
 parser.add_argument("--outdir", metavar ='OUTDIR', action = 'store',
 	type = str, dest = 'OUTDIR', required = True,
 	help = 'The output directory where to write all the output files.')
+
+parser.add_argument("--packed", action = 'store_true', dest = 'PACKED',
+	help = 'Write the output files in one packed archive OUTDIR, with its index OUTDIR.idx.')
 	
 args = parser.parse_args()
 
@@ -82,36 +89,32 @@ def main():
 	I identify Skud & Spar corresponding headers and add them to the gene list.
 	'''
 
+	# open the gene lists, the Hittinger IDs and the output, directories or archives
+	listDB = archive.open_input(args.CDlists)
+	HitDB = archive.open_input(args.Hit)
+	outStore = archive.open_output(args.OUTDIR, args.PACKED)
+
 	# loop input files
-	for file in os.listdir(args.CDlists):
+	for file in listDB["names"]:
 		outDB = []
-		with open('%s/%s' % (args.CDlists, file)) as infile:
-			for line in infile:
-				line = line.strip('\n')
-				outDB.append(line)
-				# get Scer gene ID
-				if line[:5] == "S288C":
-					Prefix, Scer_gene = line.split('_') 
-				
-			# identify corresponding Hittinger Skud & Spar IDs	
-			regex = re.compile('OG[0-9].*_' + Scer_gene)
-			for file1 in os.listdir(args.Hit):
-				if regex.match(file1):
-					with open(args.Hit + "/" + file1) as Hitfile:
-						for line in Hitfile:
-							line = line.strip('\n')
-							if line[:4] == "Skud" or line[0:3] == "Spar":
-								outDB.append(line)
+		for line in archive.read_lines(listDB, file):
+			outDB.append(line)
+			# get Scer gene ID
+			if line[:5] == "S288C":
+				Prefix, Scer_gene = line.split('_') 
+			
+		# identify corresponding Hittinger Skud & Spar IDs	
+		regex = re.compile('OG[0-9].*_' + Scer_gene)
+		for file1 in HitDB["names"]:
+			if regex.match(file1):
+				for line in archive.read_lines(HitDB, file1):
+					if line[:4] == "Skud" or line[0:3] == "Spar":
+						outDB.append(line)
 				
-		# print output file
-		outfile = args.OUTDIR + "/" + file + ".Hit"
-		oF = open(outfile, 'w')
-		
 		# print output
-		for Entry in outDB:
-			oF.write(Entry + '\n')
+		archive.write(outStore, file + ".Hit", ''.join([Entry + '\n' for Entry in outDB]))
 	
-		oF.close()
+	archive.close_output(outStore)
 
 
 
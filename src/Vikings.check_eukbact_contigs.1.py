@@ -15,11 +15,16 @@ Andrea Del Cortona
 #==================================================================#
 
 import argparse
+import bisect
+import multiprocessing
 import os
 import sys
 import re
 import statistics
 from datetime import datetime
+from vikingslib import diamond
+from vikingslib import gff
+from vikingslib import hgt
 
 
 #==================================================================#
@@ -30,7 +35,31 @@ parser = argparse.ArgumentParser(description='''I count the number of good snps
 
 usage:
 
-python3.6 check_eukbact_contigs.py --input KEVEIKS_names.lst''')
+python3.6 check_eukbact_contigs.py --input KEVEIKS_names.lst
+
+The samples are read from --workdir, and run in a pool of --jobs processes.
+A summary of all the samples is printed at the end.
+
+usage:
+
+python3.6 check_eukbact_contigs.py --input KEVEIKS_names.lst --workdir 07_HGT_test --jobs 8
+
+With --fused, no .HGT.table is written: its rows are streamed through the test of Vikings.Bactmatch.py
+and the bacterial genes with a ['Eukaryota'] row within --flank rows on the same contig are written to .HGT.bactmatch.
+The output is the one of Vikings.Bactmatch.py --flank on the .HGT.table: a gene has one row per hit,
+and a gene without hits has no row, so it is not a neighbour.
+
+As the original script, a bacterial gene name is searched as a regex in every gene name
+(so that g1 also matches g10), one search per bacterial gene over the whole proteome.
+--exact_match finds the bacterial genes by exact gene name instead, through a gene -> contigs index (faster).
+It changes the .HGT.table when a bacterial gene name is found inside other gene names, or holds regex characters.
+
+With --gff_index, the gff is parsed once into a pickled contig index (.gff.idx.pkl, next to the gff),
+reused by the next runs until the gff changes.
+
+usage:
+
+python3.6 check_eukbact_contigs.py --input KEVEIKS_names.lst --workdir 07_HGT_test --fused --flank 2 --gff_index''')
 
 parser.add_argument("--input",
 	metavar = 'INPUT',
@@ -40,6 +69,45 @@ parser.add_argument("--input",
 	help = "a list of KVEIKS names",
 	required = "TRUE")
 
+parser.add_argument("--workdir",
+	metavar = 'WORKDIR',
+	action = 'store',
+	type = str,
+	dest = 'WORKDIR',
+	help = "the directory with the .bact.lst, .tax.all and .gff files of the samples (default: /media/DISK2-3TB/03_KVEIK/07_HGT_test)",
+	default = "/media/DISK2-3TB/03_KVEIK/07_HGT_test")
+
+parser.add_argument("--jobs",
+	metavar = 'JOBS',
+	action = 'store',
+	type = int,
+	dest = 'JOBS',
+	help = "number of samples run in parallel (default: 1)",
+	default = 1)
+
+parser.add_argument("--fused",
+	action = 'store_true',
+	dest = 'FUSED',
+	help = "write the bacterial genes with eukaryotic neighbours (.HGT.bactmatch) instead of the .HGT.table")
+
+parser.add_argument("--flank",
+	metavar = 'FLANK',
+	action = 'store',
+	type = int,
+	dest = 'FLANK',
+	help = "with --fused, number of .HGT.table rows on each side checked for a eukaryotic hit, as Vikings.Bactmatch.py (default: 1)",
+	default = 1)
+
+parser.add_argument("--gff_index",
+	action = 'store_true',
+	dest = 'GFF_INDEX',
+	help = "keep the parsed gff in a pickled index next to it, rebuilt when the gff size or mtime change")
+
+parser.add_argument("--exact_match",
+	action = 'store_true',
+	dest = 'EXACT_MATCH',
+	help = "find the bacterial genes by exact gene name, not as regex substrings of the gene names as the original script (faster, the contigs can differ)")
+
 args = parser.parse_args()
 
 
@@ -49,7 +117,7 @@ args = parser.parse_args()
 
 def main():
 
-	os.chdir("/media/DISK2-3TB/03_KVEIK/07_HGT_test")
+	os.chdir(args.WORKDIR)
 
 	# get samples names
 	SAMPLE_LIST = []
@@ -58,62 +126,193 @@ def main():
 			line = line.rstrip('\n')
 			SAMPLE_LIST.append(line)
 
-	# open corresponding files and run the test for each sample
-	for sample in SAMPLE_LIST:
-		BACT_F = "{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax.bact.lst".format(sample)
-		TAX_F = "{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax.all".format(sample)
-		ANNOT_F = "{}.SPAdes.redundans.all.CDSonly.gff".format(sample)
-
-		# identify contigs of interest
-		BACT_LIST = []
-		with open(BACT_F, "r") as bactfile:
-			for line in bactfile:
-				line = line.rstrip('\n')
-				BACT_LIST.append(line.split("|", 1)[0])
-						
-		# get contig of interest
-		GENE_LIST = []
-		CONTIG_LIST = []
-		GENOME_CONT = {}
-		with open(ANNOT_F, "r") as annotfile:
-			for line in annotfile:
-				line = line.rstrip('\n')
-				POS1, POS2, POS3, POS4, POS5, POS6, POS7, POS8, POS9 = line.split('\t')
-				ADD_GENE = re.sub(r"ID=", "", POS9)
-				ADD_GENE = re.sub(r"\:cds\;.*", "", ADD_GENE)
-				if POS1 in GENOME_CONT:
-					GENOME_CONT[POS1].append(ADD_GENE.split("|", 1)[0])
-				else:
-					GENOME_CONT[POS1] = [ADD_GENE.split("|", 1)[0]]
-				
-		for BACT in BACT_LIST:
-				for k in GENOME_CONT:
-					for y in GENOME_CONT[k]:
-						z = re.search(BACT, y)
-						if z:
-							CONTIG_LIST.append(k)
-							GENE_LIST.append([k, y])				
-
-		WHOLE_TAX = []
-		with open(TAX_F, "r") as taxfile:
-			for line in taxfile:
-				line = line.rstrip('\n')
-				GENE, *TAX = line.split('\t')				
-				WHOLE_TAX.append([GENE.split("|", 1)[0], TAX])		
-		
-		# prepare the output 
-		OUTPUT = "{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax.HGT.table".format(sample) 
-		with open(OUTPUT, "w+") as outfile:
-			for CONTIG in CONTIG_LIST:
-				for GENE in GENOME_CONT[CONTIG]:
-					if GENE in BACT_LIST:
-						outfile.write(CONTIG + '\t' + GENE + '\t' + "match" + '\n')
-						continue
-					else:
-						for INFO in WHOLE_TAX:
-							if GENE == INFO[0]:
-								outfile.write(CONTIG + '\t' + GENE + '\t' + str(INFO[1]) + '\n')
-								continue
+	# open corresponding files and run the test for each sample, each worker writes its own output
+	if args.FUSED:
+		TASK = fused_sample
+		HEADER = ["sample", "bacterial_genes", "contigs", "rows", "candidates", "output"]
+	else:
+		TASK = hgt_sample
+		HEADER = ["sample", "bacterial_genes", "contigs", "rows", "matches", "output"]
+	if args.JOBS > 1:
+		with multiprocessing.Pool(args.JOBS) as pool:
+			SUMMARY = pool.map(TASK, SAMPLE_LIST)
+	else:
+		SUMMARY = [TASK(sample) for sample in SAMPLE_LIST]
+
+	print_summary(HEADER, SUMMARY)
+
+
+
+# print the summary of the outputs of all the samples
+def print_summary(HEADER, SUMMARY):
+
+	print('\t'.join(HEADER))
+	for ROW in SUMMARY:
+		print('\t'.join([str(x) for x in ROW]))
+
+
+
+# read the bacterial genes of a sample
+def read_bact(BACT_F):
+
+	BACT_LIST = []
+	for block in diamond.read_table(BACT_F, [0]):
+		for GENE in block[0]:
+			BACT_LIST.append(GENE.split("|", 1)[0])
+
+	return(BACT_LIST)
+
+
+
+# contig -> ordered genes of the gff, from its index with --gff_index
+def read_gff(ANNOT_F):
+
+	if args.GFF_INDEX:
+		return(gff.load_gff(ANNOT_F))
+
+	return(gff.parse_gff(ANNOT_F))
+
+
+
+# stream the .HGT.table rows of a sample through the test of Vikings.Bactmatch.py,
+# write its bacterial genes with a eukaryotic row within --flank rows on the same contig
+def fused_sample(sample):
+
+	BACT_SET, CONTIG_LIST, ROWS = hgt_rows(sample)
+
+	OUTPUT = "{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax.HGT.bactmatch".format(sample)
+	N_ROWS = 0
+	CANDIDATES = 0
+	with open(OUTPUT, "w") as outfile:
+		for ROW, NEIGHBOURS in hgt.flank_windows(ROWS, args.FLANK):
+			N_ROWS += 1
+			if ROW[2] == "match" and any(NEIGHBOUR[2] == hgt.EUKARYOTA for NEIGHBOUR in NEIGHBOURS):
+				outfile.write('\t'.join(ROW) + '\n')
+				CANDIDATES += 1
+
+	return([sample, len(BACT_SET), len(set(CONTIG_LIST)), N_ROWS, CANDIDATES, OUTPUT])
+
+
+
+# detect the bacterial genes of a sample and their contig neighbours, write the .HGT.table
+def hgt_sample(sample):
+
+	BACT_SET, CONTIG_LIST, ROWS = hgt_rows(sample)
+
+	# prepare the output 
+	OUTPUT = "{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax.HGT.table".format(sample) 
+	N_ROWS = 0
+	MATCHES = 0
+	with open(OUTPUT, "w+") as outfile:
+		for ROW in ROWS:
+			outfile.write('\t'.join(ROW) + '\n')
+			N_ROWS += 1
+			if ROW[2] == "match":
+				MATCHES += 1
+
+	return([sample, len(BACT_SET), len(set(CONTIG_LIST)), N_ROWS, MATCHES, OUTPUT])
+
+
+
+# read the bacterial genes, the gff and the taxonomy of a sample,
+# return the bacterial genes, the contigs of interest and a stream of the .HGT.table rows
+def hgt_rows(sample):
+
+	BACT_F = "{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax.bact.lst".format(sample)
+	TAX_F = "{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax.all".format(sample)
+	ANNOT_F = "{}.SPAdes.redundans.all.CDSonly.gff".format(sample)
+
+	# identify contigs of interest
+	BACT_LIST = read_bact(BACT_F)
+	BACT_SET = set(BACT_LIST)
+
+	# get contig of interest
+	CONTIGS = read_gff(ANNOT_F)
+	GENOME_CONT = dict((CONTIG, CONTIGS[CONTIG]["genes"]) for CONTIG in CONTIGS)
+
+	if args.EXACT_MATCH:
+		CONTIG_LIST = index_contigs(BACT_LIST, GENOME_CONT)
+	else:
+		CONTIG_LIST = match_contigs(BACT_LIST, GENOME_CONT)
+
+	# gene -> taxonomy of its hits, in file order
+	TAX_DB = {}
+	for block in diamond.read_table(TAX_F, [0], rest = True):
+		for GENE, REST in zip(block[0], block["rest"]):
+			TAX = REST.split('\t') if REST is not None else []
+			TAX_DB.setdefault(GENE.split("|", 1)[0], []).append(TAX)
+
+	return(BACT_SET, CONTIG_LIST, table_rows(CONTIG_LIST, GENOME_CONT, BACT_SET, TAX_DB))
+
+
+
+# rows of the .HGT.table: every gene of the contigs of interest, "match" for the bacterial genes,
+# one row per hit with its taxonomy for the others
+def table_rows(CONTIG_LIST, GENOME_CONT, BACT_SET, TAX_DB):
+
+	for CONTIG in CONTIG_LIST:
+		for GENE in GENOME_CONT[CONTIG]:
+			if GENE in BACT_SET:
+				yield([CONTIG, GENE, "match"])
+			else:
+				for TAX in TAX_DB.get(GENE, []):
+					yield([CONTIG, GENE, str(TAX)])
+
+
+
+# --exact_match: contig of every (bacterial gene, gene) pair with the same name, in the order of the original nested loop
+def index_contigs(BACT_LIST, GENOME_CONT):
+
+	# gene -> its contigs, once per gff line
+	GENE_INDEX = {}
+	for CONTIG in GENOME_CONT:
+		for GENE in GENOME_CONT[CONTIG]:
+			GENE_INDEX.setdefault(GENE, []).append(CONTIG)
+
+	CONTIG_LIST = []
+	for BACT in BACT_LIST:
+		CONTIG_LIST.extend(GENE_INDEX.get(BACT, []))
+
+	return(CONTIG_LIST)
+
+
+
+# contig of every (bacterial gene, gene) pair where the bacterial gene name, as a regex, is found in the gene name,
+# in the order of the original nested loop (bacterial genes, then contigs and genes)
+def match_contigs(BACT_LIST, GENOME_CONT):
+
+	CONTIGS = [k for k in GENOME_CONT for y in GENOME_CONT[k]]
+	NAMES = [y for k in GENOME_CONT for y in GENOME_CONT[k]]
+
+	# all the gene names in one string, searched once per bacterial gene
+	JOINED = '\n'.join(NAMES)
+	STARTS = []
+	OFFSET = 0
+	for NAME in NAMES:
+		STARTS.append(OFFSET)
+		OFFSET += len(NAME) + 1
+
+	CONTIG_LIST = []
+	for BACT in BACT_LIST:
+		if SAFE_NAME.fullmatch(BACT):
+			# the match cannot cross a newline: one contig per gene holding a match
+			LAST = -1
+			for MATCH in re.finditer(BACT, JOINED):
+				k = bisect.bisect_right(STARTS, MATCH.start()) - 1
+				if k != LAST:
+					CONTIG_LIST.append(CONTIGS[k])
+					LAST = k
+		else:
+			for k in range(len(NAMES)):
+				if re.search(BACT, NAMES[k]):
+					CONTIG_LIST.append(CONTIGS[k])
+
+	return(CONTIG_LIST)
+
+
+
+# gene names whose only regex metacharacter is the dot, which never matches a newline
+SAFE_NAME = re.compile(r"[A-Za-z0-9_.:\-]+")
 
 
 
@@ -126,4 +325,4 @@ if __name__ == '__main__':
 	t0 = datetime.now()
 	main()
 	dt = datetime.now() - t0
-sys.stderr.write( "# Time elapsed: %s\n" % dt )
+	sys.stderr.write( "# Time elapsed: %s\n" % dt )
@@ -14,6 +14,7 @@ Andrea Del Cortona
 
 import argparse
 import functools
+import multiprocessing
 import os
 import re
 import shutil
@@ -22,6 +23,7 @@ import sys
 import itertools
 import operator
 from datetime import datetime
+from vikingslib import tabix
 
 
 
@@ -38,6 +40,12 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
     
     Usage:
     python3.6 Vikings.culture_phasing_summary.py --input phased.vcf --name run_ID
+    python3.6 Vikings.culture_phasing_summary.py --input phased.vcf.gz --name run_ID --threads 8
+    python3.6 Vikings.culture_phasing_summary.py --input culture28.vcf.gz --trios culture28.trios.txt
+
+    culture28.trios.txt example (the name is optional, default: child_mother_father):
+    28R21   28P6    28R33
+    28R21   28P1    28R8    wrongparents1
     
     ==================================================================
     ''',
@@ -53,11 +61,22 @@ parser.add_argument("--input", metavar ='INPUT', action = 'store',
     help = 'Input phased trio.')
 
 parser.add_argument("--name", metavar ='NAME', action = 'store',
-    type = str, dest = 'NAME', required = True,
-    help = 'Name of the samples analysed.')
+    type = str, dest = 'NAME',
+    help = 'Name of the samples analysed (single trio vcf).')
+
+parser.add_argument("--trios", metavar ='TRIOS', action = 'store',
+    type = str, dest = 'TRIOS',
+    help = 'Trio specification for a multi-sample vcf: child, mother, father and optional name on each line.\nAll the trios are counted in one pass over the vcf.')
+
+parser.add_argument("--threads", metavar ='THREADS', action = 'store',
+    type = int, dest = 'THREADS', default = 1,
+    help = 'Number of processes, chromosomes (bgzip + tabix index) or byte ranges (plain vcf) are counted in parallel (default: 1).')
     
 args = parser.parse_args()
 
+if args.NAME is None and args.TRIOS is None:
+    parser.error('either --name (single trio vcf) or --trios are required')
+
 
 
 #------------------------------------------------------------------#
@@ -66,81 +85,202 @@ args = parser.parse_args()
 # main function
 def main():
     '''
-    I read the fasta file.
-    I iterate through the input directory.
-    I restrieve fasta sequences for each gene list file in the input directory.
-    I write selected fasta sequences to output directory.
+    I read the phased trio vcf file.
+    I count the phased sites of the child, chromosome by chromosome.
+    I print a summary of the phasing.
     '''
 
-    # import vcf file
-    with open(args.INPUT) as infile:
-        
-        # counters
-        current_chr = "I"
-        CHILD_counter = 0
-        N1_parents_counter = 0
-        All_parents_counter = 0
-        Same_GT_counter = 0
-
-        output_DB = {
-            "I": [],
-            "II": [],
-            "III": [],
-            "IV": [],
-            "V": [],
-            "VI": [],
-            "VII": [],
-            "VIII": [],
-            "IX": [],
-            "X": [],
-            "XI": [],
-            "XII": [],
-            "XIII": [],
-            "XIV": [],
-            "XV": [],
-            "XVI": []
-        }
+    # trios: child, mother, father columns and name
+    if args.TRIOS is not None:
+        trios = read_trios(args.TRIOS, read_samples(args.INPUT))
+    else:
+        trios = [[9, 10, 11, args.NAME]]
+    columns = [trio[:3] for trio in trios]
+
+    # import vcf file and count, chromosome by chromosome
+    if args.THREADS > 1:
+        counts_DBs = parallel_counts(args.INPUT, columns, args.THREADS)
+    else:
+        with tabix.open_text(args.INPUT) as infile:
+            counts_DBs = count_phasing(infile, columns)
+
+    # print output
+    for k in range(len(trios)):
+        print_summary(trios[k][3], counts_DBs[k])
+
+
+
+def print_summary(name, counts_DB):
+    '''
+    I print the summary of the phasing of one trio.
+    '''
+
+    output_DB = {
+        "I": ["0", "0", "0", "0"],
+        "II": [],
+        "III": [],
+        "IV": [],
+        "V": [],
+        "VI": [],
+        "VII": [],
+        "VIII": [],
+        "IX": [],
+        "X": [],
+        "XI": [],
+        "XII": [],
+        "XIII": [],
+        "XIV": [],
+        "XV": [],
+        "XVI": []
+    }
+    for chrom in counts_DB:
+        output_DB[chrom] = [str(counter) for counter in counts_DB[chrom]]
+                    
+    for chrom in output_DB:
+        print("\t".join([name, chrom, "\t".join(output_DB[chrom])]))
+
+
+
+def read_samples(vcf):
+    '''
+    I read the sample names from the #CHROM header line of the vcf file.
+    I return a dictionary sample -> column.
+    '''
 
+    with tabix.open_text(vcf) as infile:
+        for line in infile:
+            if line[:6] == "#CHROM":
+                samples = line.rstrip('\n').split('\t')
+                return(dict((samples[k], k) for k in range(9, len(samples))))
+            elif line[0] != "#":
+                break
+
+    sys.stderr.write("\n# Error: no #CHROM header line in %s \n" % vcf)
+    sys.exit(1)
+
+
+
+def read_trios(trios_file, samples):
+    '''
+    I read the trio specification: child, mother, father and an optional name on each line.
+    I return a list of [child, mother, father] columns and name (default: child_mother_father).
+    '''
+
+    trios = []
+    with open(trios_file) as infile:
         for line in infile:
-            
             line = line.rstrip('\n')
+            if line.strip() == "" or line[0] == "#":
+                continue
+            CHILD, MOTHER, FATHER, *NAME = line.split()
+            for sample in (CHILD, MOTHER, FATHER):
+                if sample not in samples:
+                    sys.stderr.write("\n# Error: the sample %s is not in the vcf file \n" % sample)
+                    sys.exit(1)
+            name = NAME[0] if NAME else "_".join([CHILD, MOTHER, FATHER])
+            trios.append([samples[CHILD], samples[MOTHER], samples[FATHER], name])
+
+    return(trios)
+
+
+
+def count_phasing(lines, trios):
+    '''
+    I count the phased sites of each trio (child, mother, father columns), chromosome by chromosome.
+    I return, for each trio, a dictionary chromosome -> [CHILD, N1_parents, All_parents, Same_GT] counters,
+    in order of appearance.
+    '''
+
+    counts_DBs = [{} for trio in trios]
+    last_column = max([max(trio) for trio in trios])
+    for line in lines:
+        
+        line = line.rstrip('\n')
+        
+        # skip header
+        if line != "" and line[0] != "#":
+            
+            fields = line.split('\t')
+            CHROM = fields[0]
+            if len(fields) <= last_column:
+                raise ValueError("the vcf line has %d columns, expected at least %d" % (len(fields), last_column + 1))
+            GT = {}
+            
+            for k in range(len(trios)):
+                CHILD, MOTHER, FATHER = trios[k]
+                for column in trios[k]:
+                    if column not in GT:
+                        GT[column] = fields[column].split(':')[0]
+                GT_CHILD, GT_MOTHER, GT_FATHER = GT[CHILD], GT[MOTHER], GT[FATHER]
             
-            # skip header
-            if line[0] != "#":
-                
-                CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, FORMAT, CHILD, MOTHER, FATHER = line.split('\t')
-                GT_CHILD, GT_MOTHER, GT_FATHER = CHILD.split(':')[0], MOTHER.split(':')[0], FATHER.split(':')[0]
-                
                 # check if the trio is phased
                 if "|" in GT_CHILD:
 
                     # get chromosome
-                    if current_chr != CHROM:
-                        # add to output
-                        output_DB[current_chr] = [str(CHILD_counter), str(N1_parents_counter), str(All_parents_counter), str(Same_GT_counter)]
-                        # reset counters
-                        current_chr = CHROM
-                        CHILD_counter = 0
-                        N1_parents_counter = 0
-                        All_parents_counter = 0
-                        Same_GT_counter = 0
-
-                    # get counts
-                    CHILD_counter += 1
+                    if CHROM not in counts_DBs[k]:
+                        counts_DBs[k][CHROM] = [0, 0, 0, 0]
+                    counters = counts_DBs[k][CHROM]
+
+                    # get counts: CHILD, N1_parents, All_parents, Same_GT
+                    counters[0] += 1
                     if GT_CHILD == GT_MOTHER and GT_CHILD == GT_FATHER:
-                        Same_GT_counter += 1
-                        All_parents_counter += 1
+                        counters[3] += 1
+                        counters[2] += 1
                     elif "|" in GT_MOTHER and "|" in GT_FATHER:
-                        All_parents_counter += 1
+                        counters[2] += 1
                     elif "|" in GT_MOTHER and "|" not in GT_FATHER or "|" not in GT_MOTHER and "|" in GT_FATHER:
-                        N1_parents_counter += 1
+                        counters[1] += 1
+
+    return(counts_DBs)
+
+
+
+def parallel_counts(vcf, trios, threads):
+    '''
+    I split the vcf file in tasks: one per chromosome with a .tbi/.csi index,
+    byte ranges of the plain text file otherwise.
+    I count each task in a process pool and I sum the counters of each trio and chromosome.
+    '''
+
+    index = tabix.find_index(vcf)
+    if index is not None:
+        tasks = [(vcf, trios, 'region', chrom) for chrom in tabix.read_index(index)["names"]]
+    elif not tabix.is_gzip(vcf):
+        step = max(1, os.path.getsize(vcf) // (threads * 4) + 1)
+        tasks = [(vcf, trios, 'bytes', what) for what in tabix.byte_ranges(vcf, step)]
+    else:
+        sys.stderr.write("# Warning: %s is compressed but not indexed, running on one thread\n" % vcf)
+        with tabix.open_text(vcf) as infile:
+            return(count_phasing(infile, trios))
+
+    # sum the counters, chromosomes in order of appearance
+    counts_DBs = [{} for trio in trios]
+    with multiprocessing.Pool(threads) as pool:
+        for task_DBs in pool.imap(count_task, tasks):
+            for k in range(len(trios)):
+                for chrom in task_DBs[k]:
+                    if chrom in counts_DBs[k]:
+                        counts_DBs[k][chrom] = [x + y for x, y in zip(counts_DBs[k][chrom], task_DBs[k][chrom])]
+                    else:
+                        counts_DBs[k][chrom] = task_DBs[k][chrom]
+
+    return(counts_DBs)
+
+
+
+def count_task(task):
+    '''
+    I count the phased sites of one task: a chromosome of an indexed vcf,
+    or the lines starting in a byte range of a plain text vcf.
+    '''
+
+    vcf, trios, kind, what = task
+    if kind == 'region':
+        index = tabix.read_index(tabix.find_index(vcf))
+        return(count_phasing(tabix.fetch(vcf, index, what, 0, 1 << 62), trios))
+    else:
+        return(count_phasing(tabix.read_range(vcf, what[0], what[1]), trios))
 
-            # add last chromosome
-            output_DB[current_chr] = [str(CHILD_counter), str(N1_parents_counter), str(All_parents_counter), str(Same_GT_counter)]
-                    
-    # print output
-    for chrom in output_DB:
-        print("\t".join([args.NAME, chrom, "\t".join(output_DB[chrom])]))
 
 
     
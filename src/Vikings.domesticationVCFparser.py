@@ -27,6 +27,7 @@ import sys
 import itertools
 import operator
 from datetime import datetime
+from vikingslib import tabix
 
 
 
@@ -55,14 +56,31 @@ parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpForm
 	_____________________
 
 	usage:
-	python3.5 Vikings.domesticationVCFparser.py --input gene.vcf --samples vcf_sample_position.txt > gene.matrix.txt''')
+	python3.5 Vikings.domesticationVCFparser.py --input gene.vcf --samples vcf_sample_position.txt > gene.matrix.txt
+
+	With --region, a single gene is read straight from a bgzip, tabix indexed whole-genome VCF.
+
+	usage:
+	python3.5 Vikings.domesticationVCFparser.py --input genome.vcf.gz --region I:1001-4000 --name 01_Maltose.MAL11 --samples vcf_sample_position.txt > gene.matrix.txt
+
+	With --regions, the input is a whole-genome VCF sorted by position, and genes.bed lists the genes
+	(chromosome, 0-based start, end, GROUP.GENE name). The VCF is read once and one GROUP.GENE.matrix.txt
+	is written for each gene in --outdir.
+	_____________________
+	
+	I	1000	4000	01_Maltose.MAL11
+	IV	52000	55000	02_Flocculation.FLO1
+	_____________________
+
+	usage:
+	python3.5 Vikings.domesticationVCFparser.py --input genome.vcf.gz --samples vcf_sample_position.txt --regions genes.bed --outdir matrices/''')
 
 parser.add_argument("--input",
 	metavar ='INPUT',
 	action = 'store',
 	type = str,
 	dest = 'INPUT',
-	help = 'A gene.vcf file.',
+	help = 'A gene.vcf file (plain, gzip or bgzip compressed).',
 	required = True)
 
 parser.add_argument("--samples",
@@ -73,6 +91,35 @@ parser.add_argument("--samples",
 	help = 'List of samples names wiht the order they appear on the vcf file.',
 	required = True)
 
+parser.add_argument("--region",
+	metavar ='REGION',
+	action = 'store',
+	type = str,
+	dest = 'REGION',
+	help = 'Only process chr:start-end. With a bgzip VCF and its .tbi/.csi index, only the blocks of the region are read.')
+
+parser.add_argument("--name",
+	metavar ='NAME',
+	action = 'store',
+	type = str,
+	dest = 'NAME',
+	help = 'GROUP.GENE name for the output (default: from the --input file name).')
+
+parser.add_argument("--regions",
+	metavar ='REGIONS',
+	action = 'store',
+	type = str,
+	dest = 'REGIONS',
+	help = 'A genes.bed file, process all the genes in one pass over a whole-genome VCF.')
+
+parser.add_argument("--outdir",
+	metavar ='OUTDIR',
+	action = 'store',
+	type = str,
+	dest = 'OUTDIR',
+	help = 'The output directory for the --regions matrices (default: current directory).',
+	default = '.')
+
 args = parser.parse_args()
 
 
@@ -84,179 +131,328 @@ args = parser.parse_args()
 # read the input table and print the output
 def main():
 
-	# import VCF file
-	with open(args.INPUT) as infile:
+	# import sample list (vcf_sample_position.txt)
+	SAMPLES = read_samples(args.SAMPLES)
 
-		GENE_DB = []
+	# all the genes in one pass
+	if args.REGIONS is not None:
+		walk_regions(read_vcf(args.INPUT, args.REGION), SAMPLES, read_regions(args.REGIONS), args.OUTDIR)
+		return()
+
+	NAME = args.NAME if args.NAME is not None else args.INPUT
+	GROUP, GENE, *OTHER = NAME.split('.')
+	SAMPLE_LIST = [[GROUP, GENE, SAMPLE, ANNOT] for SAMPLE, ANNOT in SAMPLES]
+	
+	# gene walker, the VCF file is streamed one record at a time
+	OUTPUT_MATRIX = walk_records(read_vcf(args.INPUT, args.REGION), len(SAMPLE_LIST))
+
+	#### OUTPUT
+	## stupid output without ranges
+	print_matrix(OUTPUT_MATRIX, SAMPLE_LIST)
+
+
+
+# import the sample list, in the order they appear in the VCF file
+def read_samples(samples):
+
+	SAMPLES = []
+	with open(samples) as infile:
 		for line in infile:
 			line = line.rstrip('\n')
-			CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, FORMAT, *SAMPLES = line.split('\t')
-			GENE_DB.append([[CHROM, POS],[REF, ALT, FILTER, INFO, FORMAT], SAMPLES])
-			
-	# import sample list (vcf_sample_position.txt)
-	with open(args.SAMPLES) as infile:
-		
-		GROUP, GENE, *OTHER = args.INPUT.split('.')
-		SAMPLE_LIST = []
+			SAMPLE, ANNOT = line.split('\t')
+			SAMPLES.append([SAMPLE, ANNOT])
+
+	return(SAMPLES)
+
+
+
+# import the genes.bed file, genes are sorted by start on each chromosome
+def read_regions(regions):
+
+	REGIONS = {}
+	with open(regions) as infile:
 		for line in infile:
 			line = line.rstrip('\n')
-			SAMPLE, ANNOT = line.split('\t')
-			SAMPLE_LIST.append([GROUP, GENE, SAMPLE, ANNOT])
-	
-	# gene walker
+			if line == "" or line[0] == "#":
+				continue
+			CHROM, START, STOP, NAME, *OTHER = line.split('\t')
+			if CHROM in REGIONS:
+				REGIONS[CHROM].append([int(START), int(STOP), NAME])
+			else:
+				REGIONS[CHROM] = [[int(START), int(STOP), NAME]]
+
+	for CHROM in REGIONS:
+		REGIONS[CHROM].sort(key = lambda GENE: GENE[0])
+
+	return(REGIONS)
+
+
+
+# yield the VCF lines, skipping the header. With a region, only the lines overlapping it:
+# an indexed bgzip file is read from the index, otherwise the whole file is scanned
+def read_lines(INPUT, REGION = None):
+
+	if REGION is not None:
+		CHROM, BEG, END = tabix.parse_region(REGION)
+		INDEX = tabix.find_index(INPUT)
+		if INDEX is not None:
+			for line in tabix.fetch(INPUT, tabix.read_index(INDEX), CHROM, BEG, END):
+				yield(line)
+			return
+
+	with tabix.open_text(INPUT) as infile:
+		for line in infile:
+			if line[0] == "#" or line == "\n":
+				continue
+			line = line.rstrip('\n')
+			if REGION is None or tabix.overlaps(line, CHROM, BEG, END):
+				yield(line)
+
+
+
+# yield the VCF records one at a time
+def read_vcf(INPUT, REGION = None):
+
+	for line in read_lines(INPUT, REGION):
+		CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, FORMAT, *SAMPLES = line.split('\t')
+		yield([[CHROM, POS],[REF, ALT, FILTER, INFO, FORMAT], SAMPLES])
+
+
+
+# yield the OUTPUT_MATRIX entries of a stream of VCF records
+def walk_records(RECORDS, N_SAMPLES):
+
+	WALKER = new_walker(N_SAMPLES)
+	for POSIT in RECORDS:
+		for ENTRY in walk_record(WALKER, POSIT):
+			yield(ENTRY)
+
+
+
+# state of the gene walker: the open no coverage and no alternative runs
+def new_walker(N_SAMPLES):
+
+	WALKER = {
+		"N_SAMPLES": N_SAMPLES,
+		"NO_COV_POS": [],
+		"NO_ALT_POS": [],
+		"NO_ALT_COV": ["REF" for x in range(N_SAMPLES)]
+	}
+
+	return(WALKER)
+
+
+
+# close the run of positions without coverage in all the samples
+def reset_no_cov(WALKER, OUTPUT_MATRIX):
+
+	if WALKER["NO_COV_POS"] != []:
+		OUTPUT_MATRIX.append([WALKER["NO_COV_POS"], "no coverage start", ["NO_COV" for x in range(WALKER["N_SAMPLES"])]])
+		#OUTPUT_MATRIX.append([POSIT[0], "no coverage stop", ["NO_COV" for x in range(len(SAMPLE_LIST))]])
+		WALKER["NO_COV_POS"] = []
+
+
+
+# close the run of positions without alternative alleles
+def reset_no_alt(WALKER, OUTPUT_MATRIX):
+
+	if WALKER["NO_ALT_POS"] != []:
+		if "NO_COV" not in set(WALKER["NO_ALT_COV"]):
+			OUTPUT_MATRIX.append([WALKER["NO_ALT_POS"], "no alternative start", ["REF" for x in range(WALKER["N_SAMPLES"])]])
+			#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop", ["REF" for x in range(len(SAMPLE_LIST))]])
+		else:
+			OUTPUT_MATRIX.append([WALKER["NO_ALT_POS"], "no alternative start +", WALKER["NO_ALT_COV"]])
+			#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop +", NO_ALT_COV])
+		WALKER["NO_ALT_POS"] = []
+		WALKER["NO_ALT_COV"] = ["REF" for x in range(WALKER["N_SAMPLES"])]
+
+
+
+# process one VCF record, return the OUTPUT_MATRIX entries it closes
+def walk_record(WALKER, POSIT):
+
 	OUTPUT_MATRIX = []
-	NO_COV_POS = []
-	NO_ALT_POS = []
-	NO_ALT_COV = ["REF" for x in range(len(SAMPLE_LIST))]
-	ALT_POS = ["REF" for x in range(len(SAMPLE_LIST))]
-	for POSIT in GENE_DB:
+	N_SAMPLES = WALKER["N_SAMPLES"]
+
+	# check format
+	# GT ---> 1511, no coverage in all the samples
+	if POSIT[1][4] == "GT":
+		# reset no alternative
+		reset_no_alt(WALKER, OUTPUT_MATRIX)
+		# process position
+		if WALKER["NO_COV_POS"] == []:
+			WALKER["NO_COV_POS"] = POSIT[0]
+			
+	
+	# GT:DP ---> 204302, no variants any sample OR no variants + no coverage
+	elif POSIT[1][4] == "GT:DP":
+		# reset no coverage all samples
+		reset_no_cov(WALKER, OUTPUT_MATRIX)
+		# process position
+		if WALKER["NO_ALT_POS"] == []:
+			WALKER["NO_ALT_POS"] = POSIT[0]
+			for k in range(N_SAMPLES):
+				if POSIT[2][k] == "./.:.":
+					WALKER["NO_ALT_COV"][k] = "NO_COV"
+		else:
+			NEW_ALT_COV = ["REF" for x in range(N_SAMPLES)]
+			for k in range(N_SAMPLES):
+				if POSIT[2][k] == "./.:.":
+					NEW_ALT_COV[k] = "NO_COV"
+					if NEW_ALT_COV != WALKER["NO_ALT_COV"]:
+						OUTPUT_MATRIX.append([WALKER["NO_ALT_POS"], "no alternative start +", WALKER["NO_ALT_COV"]])
+						#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop +", NO_ALT_COV])    # # # ## # I MAY WANT TO CHANGE THIS AFTERWARDS
+						WALKER["NO_ALT_POS"] = POSIT[0]
+						WALKER["NO_ALT_COV"] = NEW_ALT_COV		
+
+
+	# GT:AD:DP ---> 1, ignore them, just one positions: [VIII:526893]
+	elif POSIT[1][4] == "GT:AD:DP":
+		pass
 		
-		# check format
-		# GT ---> 1511, no coverage in all the samples
-		if POSIT[1][4] == "GT":
-			# reset no alternative
-			if NO_ALT_POS != []:
-				if "NO_COV" not in set(NO_ALT_COV):
-					OUTPUT_MATRIX.append([NO_ALT_POS, "no alternative start", ["REF" for x in range(len(SAMPLE_LIST))]])
-					#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop", ["REF" for x in range(len(SAMPLE_LIST))]])
-				else:
-					OUTPUT_MATRIX.append([NO_ALT_POS, "no alternative start +", NO_ALT_COV])
-					#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop +", NO_ALT_COV])
-				NO_ALT_POS = []
-				NO_ALT_COV = ["REF" for x in range(len(SAMPLE_LIST))]
-			# process position
-			if NO_COV_POS == []:
-				NO_COV_POS = POSIT[0]
-				
 		
-		# GT:DP ---> 204302, no variants any sample OR no variants + no coverage
-		elif POSIT[1][4] == "GT:DP":
-			# reset no coverage all samples
-			if NO_COV_POS != []:
-				OUTPUT_MATRIX.append([NO_COV_POS, "no coverage start", ["NO_COV" for x in range(len(SAMPLE_LIST))]])
-				#OUTPUT_MATRIX.append([POSIT[0], "no coverage stop", ["NO_COV" for x in range(len(SAMPLE_LIST))]])
-				NO_COV_POS = []
-			# process position
-			if NO_ALT_POS == []:
-				NO_ALT_POS = POSIT[0]
-				for k in range(len(SAMPLE_LIST)):
-					if POSIT[2][k] == "./.:.":
-						NO_ALT_COV[k] = "NO_COV"
-			else:
-				NEW_ALT_COV = ["REF" for x in range(len(SAMPLE_LIST))]
-				for k in range(len(GENE_DB[0][2])):
-					if POSIT[2][k] == "./.:.":
-						NEW_ALT_COV[k] = "NO_COV"
-						if NEW_ALT_COV != NO_ALT_COV:
-							OUTPUT_MATRIX.append([NO_ALT_POS, "no alternative start +", NO_ALT_COV])
-							#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop +", NO_ALT_COV])    # # # ## # I MAY WANT TO CHANGE THIS AFTERWARDS
-							NO_ALT_POS = POSIT[0]
-							NO_ALT_COV = NEW_ALT_COV		
-
-
-		# GT:AD:DP ---> 1, ignore them, just one positions: [VIII:526893]
-		elif POSIT[1][4] == "GT:AD:DP":
-			continue
-			
-			
-		# GT:AD:DP:GQ ---> 534, multiallelic variant + no coverage
-		elif POSIT[1][4] == "GT:AD:DP:GQ":
-			# reset no coverage all samples
-			if NO_COV_POS != []:
-				OUTPUT_MATRIX.append([NO_COV_POS, "no coverage start", ["NO_COV" for x in range(len(SAMPLE_LIST))]])
-				#OUTPUT_MATRIX.append([POSIT[0], "no coverage stop", ["NO_COV" for x in range(len(SAMPLE_LIST))]])
-				NO_COV_POS = []	
-			# reset no alternative
-			if NO_ALT_POS != []:
-				if "NO_COV" not in set(NO_ALT_COV):
-					OUTPUT_MATRIX.append([NO_ALT_POS, "no alternative start", ["REF" for x in range(len(SAMPLE_LIST))]])
-					#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop", ["REF" for x in range(len(SAMPLE_LIST))]])
-				else:
-					OUTPUT_MATRIX.append([NO_ALT_POS, "no alternative start +", NO_ALT_COV])
-					#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop +", NO_ALT_COV])
-				NO_ALT_POS = []
-				NO_ALT_COV = ["REF" for x in range(len(SAMPLE_LIST))]	
-			# process position
-			*ALT, = POSIT[1][1].split(',')
-			NALT = len(ALT)
-			for k in range(len(SAMPLE_LIST)):
-				GT, AD, DP, GQ = POSIT[2][k].split(':')
-				if POSIT[2][k] == "./.:.:.:.":
-					ALT_POS[k] = "NO_COV"
-				elif GT != "0/0":
-					ALT1, ALT2 = GT.split('/')
-					# ALT_POS[k] = "ALT" + str(ALT1) + "," + "ALT" + str(ALT2)
-					ALT_POS[k] = GT
-			OUTPUT_MATRIX.append([POSIT[0], "multiallelic locus", ALT_POS])
-			ALT_POS = ["REF" for x in range(len(SAMPLE_LIST))]
-			
-			############ ALT_POS = "REF" for x in range(len(GENE_DB[0][2]))]
-			
-			### check impact of variatn
-
-
-		# GT:AD:DP:GQ:PL ---> 33537, biallelic variant + no covaerage
-		elif POSIT[1][4] == "GT:AD:DP:GQ:PL":
-			# reset no coverage all samples
-			if NO_COV_POS != []:
-				OUTPUT_MATRIX.append([NO_COV_POS, "no coverage start", ["NO_COV" for x in range(len(SAMPLE_LIST))]])
-				#OUTPUT_MATRIX.append([POSIT[0], "no coverage stop", ["NO_COV" for x in range(len(SAMPLE_LIST))]])
-				NO_COV_POS = []	
-			# reset no alternative
-			if NO_ALT_POS != []:
-				if "NO_COV" not in set(NO_ALT_COV):
-					OUTPUT_MATRIX.append([NO_ALT_POS, "no alternative start", ["REF" for x in range(len(SAMPLE_LIST))]])
-					#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop", ["REF" for x in range(len(SAMPLE_LIST))]])
-				else:
-					OUTPUT_MATRIX.append([NO_ALT_POS, "no alternative start +", NO_ALT_COV])
-					#OUTPUT_MATRIX.append([POSIT[0], "no alternative stop +", NO_ALT_COV])
-				NO_ALT_POS = []
-				NO_ALT_COV = ["REF" for x in range(len(SAMPLE_LIST))]	
-			# process position
-			for k in range(len(SAMPLE_LIST)):
-				GT, AD, DP, GQ, PL = POSIT[2][k].split(':')
-				if POSIT[2][k] == "./.:.:.:.:.":
-					ALT_POS[k] = "NO_COV"
-				elif GT != "0/0":
-					ALT1, ALT2 = GT.split('/')
-					# ALT_POS[k] = "ALT" + str(ALT1) + "," + "ALT" + str(ALT2)
-					ALT_POS[k] = GT
-			OUTPUT_MATRIX.append([POSIT[0], "biallelic locus", ALT_POS])
-			ALT_POS = ["REF" for x in range(len(SAMPLE_LIST))]
-			
-			############ ALT_POS = "REF" for x in range(len(GENE_DB[0][2]))]
-			
-			### check impact of variatn
+	# GT:AD:DP:GQ ---> 534, multiallelic variant + no coverage
+	elif POSIT[1][4] == "GT:AD:DP:GQ":
+		# reset no coverage all samples
+		reset_no_cov(WALKER, OUTPUT_MATRIX)
+		# reset no alternative
+		reset_no_alt(WALKER, OUTPUT_MATRIX)
+		# process position
+		ALT_POS = genotype_labels(POSIT[2][:N_SAMPLES], 4)
+		OUTPUT_MATRIX.append([POSIT[0], "multiallelic locus", ALT_POS])
+		
+		### check impact of variatn
 
-	'''
-	#### OUTPUT
-	## stupid output without ranges
-	for ENTRY in OUTPUT_MATRIX:
-		if set(ENTRY[2]) == REF:
-			continue
-		else:
-			for k in range(len(SAMPLE_LIST)):
-				#SAMPLE_LIST[k].append('\t'.join(ENTRY[0]))
-				SAMPLE_LIST[k].append(ENTRY[2][k])
+
+	# GT:AD:DP:GQ:PL ---> 33537, biallelic variant + no covaerage
+	elif POSIT[1][4] == "GT:AD:DP:GQ:PL":
+		# reset no coverage all samples
+		reset_no_cov(WALKER, OUTPUT_MATRIX)
+		# reset no alternative
+		reset_no_alt(WALKER, OUTPUT_MATRIX)
+		# process position
+		ALT_POS = genotype_labels(POSIT[2][:N_SAMPLES], 5)
+		OUTPUT_MATRIX.append([POSIT[0], "biallelic locus", ALT_POS])
+		
+		### check impact of variatn
+
+	return(OUTPUT_MATRIX)
+
+
+
+# send each record of a sorted whole-genome VCF to the walker of the genes it falls in,
+# only the walkers of the genes overlapping the current position are kept open
+def walk_regions(RECORDS, SAMPLES, REGIONS, OUTDIR):
+
+	ACTIVE = []																	# open genes: [STOP, WALKER, SAMPLE_LIST, COUNT, outfile]
+	WRITTEN = set()
+	DONE_CHROMS = set()
+	CHROM = None
+	LAST_POS = 0
+	NEXT = 0
+	for POSIT in RECORDS:
+		POS = int(POSIT[0][1])
+
+		# new chromosome, close all the genes of the previous one
+		if POSIT[0][0] != CHROM:
+			if POSIT[0][0] in DONE_CHROMS:
+				sys.stderr.write("\n# Error: the VCF file is not sorted, %s appears twice \n" % POSIT[0][0])
+				sys.exit(1)
+			for GENE_OUT in ACTIVE:
+				GENE_OUT[4].close()
+			ACTIVE = []
+			DONE_CHROMS.add(CHROM)
+			CHROM = POSIT[0][0]
+			GENES = REGIONS.get(CHROM, [])
+			LAST_POS = 0
+			NEXT = 0
+		elif POS < LAST_POS:
+			sys.stderr.write("\n# Error: the VCF file is not sorted, %s:%s comes after %s:%s \n" % (CHROM, POS, CHROM, LAST_POS))
+			sys.exit(1)
+		LAST_POS = POS
+
+		# open the genes starting before this position, close the genes ending before it
+		while NEXT < len(GENES) and GENES[NEXT][0] < POS:
+			ACTIVE.append(open_gene(GENES[NEXT], SAMPLES, OUTDIR))
+			WRITTEN.add(GENES[NEXT][2])
+			NEXT += 1
+		for GENE_OUT in ACTIVE:
+			if GENE_OUT[0] < POS:
+				GENE_OUT[4].close()
+		ACTIVE = [GENE_OUT for GENE_OUT in ACTIVE if GENE_OUT[0] >= POS]
+
+		# walk the record in each gene
+		for GENE_OUT in ACTIVE:
+			GENE_OUT[3] = write_entries(walk_record(GENE_OUT[1], POSIT), GENE_OUT[2], GENE_OUT[3], GENE_OUT[4])
+
+	for GENE_OUT in ACTIVE:
+		GENE_OUT[4].close()
 	
-	for k in SAMPLE_LIST:
-		print('\t'.join(k))
-	#print(OUTPUT_MATRIX)
-	'''
-	#### OUTPUT
-	## stupid output without ranges
-	OUTPUT = []
+	# genes without any record still get their (empty) matrix
+	for CHROM in REGIONS:
+		for GENE in REGIONS[CHROM]:
+			if GENE[2] not in WRITTEN:
+				open(os.path.join(OUTDIR, GENE[2] + ".matrix.txt"), 'w').close()
+
+
+
+# start the walker and the output matrix of a gene
+def open_gene(GENE, SAMPLES, OUTDIR):
+
+	START, STOP, NAME = GENE
+	GROUP, GENE, *OTHER = NAME.split('.') + [""]
+	SAMPLE_LIST = [[GROUP, GENE, SAMPLE, ANNOT] for SAMPLE, ANNOT in SAMPLES]
+	outfile = open(os.path.join(OUTDIR, NAME + ".matrix.txt"), 'w')
+
+	return([STOP, new_walker(len(SAMPLES)), SAMPLE_LIST, 1, outfile])
+
+
+
+# turn the sample columns of a record into the matrix labels: REF (0/0), NO_COV (all the N_KEYS fields missing)
+# or the genotype (e.g.: 0/1)
+def genotype_labels(FIELDS, N_KEYS):
+
+	NO_COV = ':'.join(["./."] + ["." for x in range(N_KEYS - 1)])
+	LABELS = []
+	for FIELD in FIELDS:
+		KEYS = FIELD.split(':')
+		if len(KEYS) != N_KEYS:
+			raise ValueError("sample column %s does not have %d FORMAT fields" % (FIELD, N_KEYS))
+		GT = KEYS[0]
+		if GT == "0/0":
+			LABELS.append("REF")
+		elif FIELD == NO_COV:
+			LABELS.append("NO_COV")
+		else:
+			if GT.count('/') != 1:
+				raise ValueError("unphased diploid genotypes are expected, found: %s" % GT)
+			LABELS.append(GT)
+
+	return(LABELS)
+
+
+
+# print the entries with at least one non reference sample, as soon as they are produced
+def print_matrix(OUTPUT_MATRIX, SAMPLE_LIST):
+
 	COUNT = 1
 	for ENTRY in OUTPUT_MATRIX:
-		if set(ENTRY[2]) == REF:
+		COUNT = write_entries([ENTRY], SAMPLE_LIST, COUNT, sys.stdout)
+
+
+
+# write a list of OUTPUT_MATRIX entries, return the updated entry count
+def write_entries(ENTRIES, SAMPLE_LIST, COUNT, outfile):
+
+	for ENTRY in ENTRIES:
+		if set(ENTRY[2]) == {"REF"}:
 			continue
 		else:
 			for k in range(len(SAMPLE_LIST)):
-				OUTPUT.append(['\t'.join(SAMPLE_LIST[k]), str(COUNT), ENTRY[2][k]])
+				outfile.write('\t'.join(['\t'.join(SAMPLE_LIST[k]), str(COUNT), ENTRY[2][k]]) + '\n')
 			COUNT += 1
-	
-	for k in OUTPUT:
-		print('\t'.join(k))
+
+	return(COUNT)
 
 
 	
@@ -21,8 +21,12 @@ import shutil
 import string
 import sys
 import itertools
+import math
 import operator
+import collections
 from datetime import datetime
+from vikingslib import archive
+from vikingslib import cdhit
 
 
 
@@ -35,6 +39,11 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 	==================================================================
 	I take a cluster file generated by running CDHIT clustering with 70% on amino acid yeast proteins.
 	I return more refined clusters which should contain only one ortholog.
+	With --packed the gene lists of the clusters are written in one archive all_plusKV.nt.098.fa.clstr.fltr.clstr
+	(+ .idx index) instead of one all_plusKV.nt.098.fa.clstr.fltr.clstr.N file per cluster.
+	The clstr is streamed: each cluster is divided, logged and printed before the next one is read.
+	The seeds of the subclusters are indexed by 5% bands of length and %id, a sequence is compared only
+	to the seeds of the neighbouring bands, and the first matching seed is kept as in a linear scan.
 	
 	__________________________________________________________________
 	
@@ -53,6 +62,7 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 	
 	Usage:
 	python3.6 Vikings.filterCDHITclusters.py --clstr all_plusKV.nt.098.fa.clstr
+	python3.6 Vikings.filterCDHITclusters.py --clstr all_plusKV.nt.098.fa.clstr --packed
 	
 	==================================================================
 	''',
@@ -66,6 +76,9 @@ parser = argparse.ArgumentParser(formatter_class = argparse.RawTextHelpFormatter
 parser.add_argument("--clstr", metavar ='CLSTR', action = 'store',
 	type = str, dest = 'CLSTR', required = True,
 	help = 'The cluster output from CD-HIT.')
+
+parser.add_argument("--packed", action = 'store_true', dest = 'PACKED',
+	help = 'Write the gene lists of the clusters in one packed archive.')
 	
 args = parser.parse_args()
 
@@ -77,136 +90,167 @@ args = parser.parse_args()
 # main function
 def main():
 	'''
-	I read the clstr.
-	I divide into smaller clusters with similar length and %id.
+	I read the clstr, one cluster at a time.
+	I divide each cluster into smaller clusters with similar length and %id.
 	I discard outliers.
-	I print the output clusters.
+	I print the log and the output clusters as they are made, and the gene matrix at the end.
 	'''
 
-	# read input datasets
-	raw_clstrDB = read_clstr(args.CLSTR)
+	# open output files
+	outLog = open_Log()
+	outDB = open_clstr()
 	
-	# divide each cluster in smaller 1 ortholog cluster
-	processed_clstr = process_clstr(raw_clstrDB)
-	clean_clstrDB = processed_clstr[0]
-	filter_log = processed_clstr[1]
+	# divide each cluster in smaller 1 ortholog cluster, keep only the strain counts
+	StrainCounts = []
+	LastStrain = None
+	for clstr in read_clstr(args.CLSTR):
+		for newClstr, members in process_clstr(clstr):
+			print_Log(outLog, clstr, newClstr, members)
+			print_clstr(outDB, len(StrainCounts), [clstr["names"][k] for k in members])
+			StrainCounts.append(collections.Counter([clstr["names"][k].split('_')[0] for k in members]))
+			LastStrain = clstr["names"][members[-1]].split('_')[0]
+	outLog.close()
+	archive.close_output(outDB)
 	
-	# print output files
-	print_Log(filter_log)
-	print_clstr(clean_clstrDB)
-	print_GeneMatrix(clean_clstrDB)
+	# print the gene matrix
+	print_GeneMatrix(StrainCounts, LastStrain)
 
 
 
 def read_clstr(input):
 	'''
-	I read a clstr input file.
-	I return a dictionary of clusters.
+	I read a clstr input file, one cluster at a time.
+	I yield the clusters: name, member names and numeric lengths and %id, the representative first.
 	'''
 	
-	# declare output dictionary
-	raw_clstrDB = {}
-
-	# import clstr file
-	with open(input) as infile:
-		for line in infile:
-			line = line.rstrip('\n')
-			# is it a new cluster?
-			if line[0] == ">":
-				curr_clstr = line[1:]
-				raw_clstrDB[curr_clstr] = [[]]
-			else:
-				Num, Info = line.split('\t')
-				LenRaw, NameRaw, *pidRaw = Info.split(' ')
-				# clean name and length
-				Len = LenRaw.replace(',', '').replace('aa', '')
-				Name = NameRaw.replace('>', '').replace('...', '')
-				# is it cluster representative?
-				if pidRaw == ["*"]:
-					raw_clstrDB[curr_clstr][0] = [Name, Len, "100.00"]
-				else:
-					pid = pidRaw[1].replace('%', '')
-					raw_clstrDB[curr_clstr].append([Name, Len, pid])
-	
-	# protein names sanity check
-	for clstr in raw_clstrDB:
-		NamesDB = []
-		for entry in raw_clstrDB[clstr]:
-			if entry[0] in NamesDB:
-				sys.stderr.write( "\n# Error: the sequence {} is present more than once in cluster {} \n".format(entry[0], clstr))
+	for clstr in cdhit.read_clusters(input):
+		# protein names sanity check
+		NamesDB = set()
+		for Name in clstr["names"]:
+			if Name in NamesDB:
+				sys.stderr.write( "\n# Error: the sequence {} is present more than once in cluster {} \n".format(Name, clstr["name"]))
 				exit
 			else:
-				NamesDB.append(entry[0])
-
-	return(raw_clstrDB)
+				NamesDB.add(Name)
+		
+		yield(clstr)
 
 
 	
-def process_clstr(raw_clstrDB):
+def process_clstr(clstr):
 	'''
-	I read the raw clusters and divide them according to sequence length,
+	I read a raw cluster and divide it according to sequence length,
 	percentage of identity with reference sequence.
 	I drop outliers.
-	I return a list of clusters, and a log with all the entry, wether discarded or not.
+	I return the subclusters: their number and the indices of their members in the cluster.
 	'''
 	
-	# declare output dictionary
-	clean_clstrDB = []
-	filter_log = []
-	
-	# filter clusters
-	for clstr in raw_clstrDB:
-		# declare temporary clusters
-		i = 0
-		tmp_clstr = {}
-		# reference sequence
-		NameR = raw_clstrDB[clstr][0][0]
-		LenR = raw_clstrDB[clstr][0][1]
-		pidR = raw_clstrDB[clstr][0][2]
-		tmp_clstr[i] = [[NameR, LenR, pidR]]
-		# iterate through sequences in cluster
-		for k in range(len(raw_clstrDB[clstr]) - 1):
-			# current sequence
-			Name = raw_clstrDB[clstr][k][0]
-			Len = raw_clstrDB[clstr][k][1]
-			pid = raw_clstrDB[clstr][k][2]
-			# retain sequences within 5% of pid and 5% length
-			if float(pid) > float(95) and (float(Len) > float(LenR)*0.95 and float(Len) < float(LenR)*1.05):
-				tmp_clstr[0].append([Name, Len, pid])
+	Len = clstr["length"].tolist()
+	pid = clstr["pid"].tolist()
+	
+	# declare temporary clusters
+	i = 0
+	tmp_clstr = {}
+	# seeds that can be matched, by length and %id band
+	seedDB = {}
+	# reference sequence
+	LenR = Len[0]
+	tmp_clstr[i] = [0]
+	# retain sequences within 5% of pid and 5% length
+	core = ((clstr["pid"] > 95.0) & (clstr["length"] > LenR*0.95) & (clstr["length"] < LenR*1.05)).tolist()
+	# iterate through sequences in cluster (the representative included, the last one excluded)
+	for k in range(len(clstr["names"]) - 1):
+		if core[k]:
+			tmp_clstr[0].append(k)
+		else:
+			# check other entry: the first seed within 5% of pid and 5% length
+			j = find_seed(seedDB, tmp_clstr, Len, pid, k)
+			if j is not None:
+				tmp_clstr[j].append(k)
+			# if no match create new cluster
 			else:
-				isnewClstr = True
-				# check other entry
-				for j in range(len(tmp_clstr) - 1):
-					if (float(pid) >= float(tmp_clstr[j][0][2])*0.95 and float(pid) <= float(tmp_clstr[j][0][2])*1.05) and \
-						(float(Len) >= float(tmp_clstr[j][0][1])*0.95 and float(Len) <= float(tmp_clstr[j][0][1])*1.05):
-						tmp_clstr[j].append([Name, Len, pid])
-						isnewClstr = False
-						break
-				# if no match create new cluster
-				if isnewClstr == True:
-					i = i + 1
-					tmp_clstr[i] = [[Name, Len, pid]]	
-		
-		# discard singletons
-		for newClstr in tmp_clstr:
-			# remove outliers clusters
-			# if len(tmp_clstr[newClstr]) < 311 or len(tmp_clstr[newClstr]) > 350:
-			# 	# print to log
-			#	for entry in tmp_clstr[newClstr]:
-			#		filter_log.append([clstr, "subclstr " + str(newClstr), entry[0], entry[1], entry[2], "Discarded"])
-			#else:
-				# print to log
-				clean_clstrDB.append(tmp_clstr[newClstr])
-				for entry in tmp_clstr[newClstr]:					
-					filter_log.append([clstr, "subclstr " + str(newClstr), entry[0], entry[1], entry[2], "Retained"])
+				# the newest seed is not checked until the next one is made
+				add_seed(seedDB, i, Len[tmp_clstr[i][0]], pid[tmp_clstr[i][0]])
+				i = i + 1
+				tmp_clstr[i] = [k]
+	
+	# discard singletons
+	subclstrDB = []
+	for newClstr in tmp_clstr:
+		# remove outliers clusters
+		# if len(tmp_clstr[newClstr]) < 311 or len(tmp_clstr[newClstr]) > 350:
+		# 	# print to log as "Discarded"
+		#else:
+			subclstrDB.append([newClstr, tmp_clstr[newClstr]])
+	
+	return(subclstrDB)
+	
+
+	
+# width of the length and %id bands of the seeds, in log scale
+BAND = math.log(1.05)
+
+
+
+def band(value):
+	'''
+	I return the log-scale band of a length or %id (None for 0).
+	'''
 	
-	return(clean_clstrDB, filter_log)
+	if value <= 0:
+		return(None)
 	
+	return(math.floor(math.log(value) / BAND))
+
 
+
+def bands(value):
+	'''
+	I return the bands of the seeds that can be within 5% of value (value/1.05 to value/0.95),
+	one more band on each side against rounding.
+	'''
 	
-def print_Log(filter_log):
+	if value <= 0:
+		return([None])
+	
+	return(range(band(value / 1.05) - 1, band(value / 0.95) + 2))
+
+
+
+def add_seed(seedDB, j, Len, pid):
 	'''
-	I print a summary of filtering clusters.
+	I index the seed of the subcluster j by its length and %id bands.
+	'''
+	
+	seedDB.setdefault((band(Len), band(pid)), []).append(j)
+
+
+
+def find_seed(seedDB, tmp_clstr, Len, pid, k):
+	'''
+	I return the first indexed subcluster whose seed is within 5% of pid and 5% length of the sequence k, or None.
+	'''
+	
+	first = None
+	for LenBand in bands(Len[k]):
+		for pidBand in bands(pid[k]):
+			for j in seedDB.get((LenBand, pidBand), []):
+				# seeds of a band are in order, only an earlier one can do better
+				if first is not None and j >= first:
+					break
+				seed = tmp_clstr[j][0]
+				if (pid[k] >= pid[seed]*0.95 and pid[k] <= pid[seed]*1.05) and \
+					(Len[k] >= Len[seed]*0.95 and Len[k] <= Len[seed]*1.05):
+					first = j
+					break
+	
+	return(first)
+	
+
+	
+def open_Log():
+	'''
+	I open the log of filtering clusters and print its header.
 	'''
 	
 	# define outfile
@@ -216,64 +260,69 @@ def print_Log(filter_log):
 	# print header
 	oF.write('# Original Cluster\tSubcluster\tGene\tLength\t%Id\tFiltered?\n')
 	
-	# print output
-	for Entry in filter_log:
-		oF.write('\t'.join(Entry) + '\n')
+	return(oF)
+
+
+
+def print_Log(oF, clstr, newClstr, members):
+	'''
+	I print the entries of a subcluster to the log.
+	'''
 	
-	oF.close()
+	for k in members:
+		oF.write('\t'.join([clstr["name"], "subclstr " + str(newClstr), clstr["names"][k], str(clstr["length"][k]), '%.2f' % clstr["pid"][k], "Retained"]) + '\n')
 	
 	
 	
-def print_clstr(clean_clstrDB):
+def open_clstr():
 	'''
-	I print a list of genes for each cluster.
+	I open the output of the gene lists: the working directory or one archive.
+	'''
+	
+	if args.PACKED:
+		return(archive.open_output("all_plusKV.nt.098.fa.clstr.fltr.clstr", packed = True))
+	
+	return(archive.open_output("."))
+
+
+
+def print_clstr(outDB, i, Genes):
+	'''
+	I print the list of genes of the cluster i.
 	'''	
 	
-	# print the clusters
-	i = 0
-	for clstr in clean_clstrDB:
-		# define outfile
-		outClstr = "all_plusKV.nt.098.fa.clstr.fltr.clstr." + str(i)
-		oF = open(outClstr, 'w')
-		for k in range(len(clstr)):
-			oF.write(clstr[k][0] + '\n')
-		oF.close()	
-		i = i + 1
+	# define outfile
+	outClstr = "all_plusKV.nt.098.fa.clstr.fltr.clstr." + str(i)
+	archive.write(outDB, outClstr, ''.join([Gene + '\n' for Gene in Genes]))
 
 
 
-def print_GeneMatrix(clean_clstrDB):
+def print_GeneMatrix(StrainCounts, LastStrain):
 	'''
-	I print a matrix with gene/species occupancy for each cluster that passed the filter.
+	I print a matrix with gene/species occupancy for each cluster that passed the filter,
+	from the strain counts of the clusters and the strain of the last gene printed.
 	'''	
 	
-	# get Strain list
+	# get Strain list, in order of first appearance
 	StrainList = []
-	for clstr in clean_clstrDB:
-		for k in range(len(clstr)):
-			Strain = clstr[k][0].split('_')[0]
+	for Counts in StrainCounts:
+		for Strain in Counts:
 			if re.match('WL1EUK', Strain):
 				continue
 			else:
 				if Strain not in StrainList:
 					StrainList.append(Strain)
 	
+	# as the original loops, no gene is counted when the strain of the last gene is a WL1EUK
+	if LastStrain is not None and re.match('WL1EUK', LastStrain):
+		StrainCounts = [collections.Counter() for Counts in StrainCounts]
+	
 	# create Matrix
 	i = 0
 	Matrix = []
 	Matrix.append(['# Cluster', '\t'.join(StrainList)])
-	for clstr in clean_clstrDB:
-		NewRow = [0 for k in range(len(StrainList))]
-		for k in range(len(StrainList)):
-			for Gene in clstr:
-				StrainG = Gene[0].split('_')[0]
-				if re.match('WL1EUK', Strain):
-					continue
-				else:
-					if StrainG == StrainList[k]:
-						NewRow[k] = NewRow[k] + 1
-		for k in range(len(NewRow)):
-			NewRow[k] = str(NewRow[k])
+	for Counts in StrainCounts:
+		NewRow = [str(Counts[Strain]) for Strain in StrainList]
 		i = i + 1
 		Matrix.append([str(i), '\t'.join(NewRow)])
 	
@@ -294,4 +343,4 @@ if __name__ == '__main__':
 	t0 = datetime.now()
 	main()
 	dt = datetime.now() - t0
-sys.stderr.write( "# Time elapsed: %s\n" % dt )
+	sys.stderr.write( "# Time elapsed: %s\n" % dt )
@@ -18,14 +18,17 @@ Andrea Del Cortona
 #==================================================================#
 
 import argparse
+import bisect
 import functools
+import numpy
 import os
 import re
 import shutil
-import string
 import statistics
+import string
 import sys
 import itertools
+import math
 import operator
 from datetime import datetime
 
@@ -70,6 +73,20 @@ parser.add_argument("--bed",
 	help = 'Vikings.CNVsmerged.all.bed.',
 	required = True)
 
+parser.add_argument("--npz",
+	metavar ='NPZ',
+	action = 'store',
+	type = str,
+	dest = 'NPZ',
+	help = 'Also save the matrix to this .npz file (chrom, start, stop, samples, mean, sum, count arrays; mean is NaN for empty cells).')
+
+parser.add_argument("--parquet",
+	metavar ='PARQUET',
+	action = 'store',
+	type = str,
+	dest = 'PARQUET',
+	help = 'Also save the matrix to this Parquet file (chrom, start, stop, then one column per sample; requires pandas).')
+
 args = parser.parse_args()
 
 
@@ -109,46 +126,118 @@ def main():
 
 	CHR_LIST = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII", "XIII", "XIV", "XV", "XVI", "Mito"]
 	
-	# iterate through chromosomes and overlap windows
-	OUTPUT = []
-	j = 0
+	# index the CNVs of each sample, chromosome by chromosome
+	CNV_INDEX = index_cnvs(SAMPLES_DB)
+
+	# windows, in chromosome order
+	WINDOWS = []
 	for CHR in CHR_LIST:
 		for POS in WIND_DB[CHR]:
-			OUTPUT.append([CHR, POS[0], POS[1]])
-			k = 3
-			for SAMPLE in SAMPLES_LIST:
-				OUTPUT[j].append([])
-				#OUTPUT.append([])
-				for ENTRY in SAMPLES_DB:
-					# if sample is correct
-					if ENTRY == SAMPLE:
-						for LINE in SAMPLES_DB[ENTRY]:
-							# correct chromosome?
-							if LINE[0] == CHR:
-								START = LINE[1]
-								STOP = LINE[2]
-								if int(START) >= int(POS[0]) and int(STOP) <= int(POS[1]):
-									OUTPUT[j][k].append(str(LINE[4]))
-				if OUTPUT[j][k] == []:
-					OUTPUT[j][k] = ''
-				else:
-					OUTPUT[j][k] = ';'.join(OUTPUT[j][k])
-				k += 1
-			j += 1
-
-	# collapse to the average
-	for i in range(len(OUTPUT)):
-		for k in range(3, len(OUTPUT[i])):
-			if OUTPUT[i][k] != '':
-				NUMS = OUTPUT[i][k].split(";")
-				NUMS = [float(x) for x in NUMS]
-				AVG = statistics.mean(NUMS)
-				OUTPUT[i][k] = str(round(AVG, 3))
-
-	# print output
+			WINDOWS.append([CHR, POS[0], POS[1]])
+
+	# iterate through windows and samples, keep the sum (math.fsum, exactly rounded) and count of the fold changes in each cell
+	SUM = numpy.zeros((len(WINDOWS), len(SAMPLES_LIST)), dtype = numpy.float64)
+	COUNT = numpy.zeros((len(WINDOWS), len(SAMPLES_LIST)), dtype = numpy.int64)
+	for i in range(len(WINDOWS)):
+		CHR = WINDOWS[i][0]
+		W_START = int(WINDOWS[i][1])
+		W_STOP = int(WINDOWS[i][2])
+		for k in range(len(SAMPLES_LIST)):
+			if (SAMPLES_LIST[k], CHR) in CNV_INDEX:
+				FOLDS = contained_folds(CNV_INDEX[(SAMPLES_LIST[k], CHR)], W_START, W_STOP)
+				SUM[i, k] = math.fsum(FOLDS)
+				COUNT[i, k] = len(FOLDS)
+
+	# collapse to the average, NaN for empty cells
+	MATRIX = numpy.full(SUM.shape, numpy.nan)
+	numpy.divide(SUM, COUNT, out = MATRIX, where = COUNT > 0)
+
+	# print output, empty cells are left blank
 	print('\t'.join(['', '', '', '\t'.join(SAMPLES_LIST)]))
-	for k in OUTPUT:
-		print('\t'.join(k))
+	for i in range(len(WINDOWS)):
+		ROW = list(WINDOWS[i])
+		for k in range(len(SAMPLES_LIST)):
+			if COUNT[i, k] == 0:
+				ROW.append('')
+			else:
+				ROW.append(str(round(float(MATRIX[i, k]), 3)))
+		print('\t'.join(ROW))
+
+	# binary outputs
+	if args.NPZ is not None:
+		write_npz(args.NPZ, WINDOWS, SAMPLES_LIST, MATRIX, SUM, COUNT)
+	if args.PARQUET is not None:
+		write_parquet(args.PARQUET, WINDOWS, SAMPLES_LIST, MATRIX)
+
+
+
+# index the CNVs by sample and chromosome: starts, stops and fold changes sorted by start
+def index_cnvs(SAMPLES_DB):
+
+	CNV_INDEX = {}
+	for SAMPLE in SAMPLES_DB:
+		for LINE in SAMPLES_DB[SAMPLE]:
+			KEY = (SAMPLE, LINE[0])
+			if KEY in CNV_INDEX:
+				CNV_INDEX[KEY].append([int(LINE[1]), int(LINE[2]), float(LINE[4])])
+			else:
+				CNV_INDEX[KEY] = [[int(LINE[1]), int(LINE[2]), float(LINE[4])]]
+
+	for KEY in CNV_INDEX:
+		CNV_INDEX[KEY].sort(key = lambda CNV: CNV[0])
+		STARTS = [CNV[0] for CNV in CNV_INDEX[KEY]]
+		STOPS = [CNV[1] for CNV in CNV_INDEX[KEY]]
+		FOLDS = [CNV[2] for CNV in CNV_INDEX[KEY]]
+		CNV_INDEX[KEY] = [STARTS, STOPS, FOLDS]
+
+	return(CNV_INDEX)
+
+
+
+# return the fold changes of the indexed CNVs contained in the window W_START-W_STOP
+def contained_folds(INDEX, W_START, W_STOP):
+
+	STARTS, STOPS, FOLDS = INDEX
+	CONTAINED = []
+	# CNVs starting before the window cannot be contained, stop at the first one starting after it
+	k = bisect.bisect_left(STARTS, W_START)
+	while k < len(STARTS) and STARTS[k] <= W_STOP:
+		if STOPS[k] <= W_STOP:
+			CONTAINED.append(FOLDS[k])
+		k += 1
+
+	return(CONTAINED)
+
+
+
+# save the window x sample matrix as a numpy .npz archive
+def write_npz(outname, WINDOWS, SAMPLES_LIST, MATRIX, SUM, COUNT):
+
+	numpy.savez_compressed(outname,
+		chrom = numpy.array([WINDOW[0] for WINDOW in WINDOWS], dtype = str),
+		start = numpy.array([int(WINDOW[1]) for WINDOW in WINDOWS], dtype = numpy.int64),
+		stop = numpy.array([int(WINDOW[2]) for WINDOW in WINDOWS], dtype = numpy.int64),
+		samples = numpy.array(SAMPLES_LIST, dtype = str),
+		mean = MATRIX,
+		sum = SUM,
+		count = COUNT)
+
+
+
+# save the window x sample matrix as a Parquet table, one column per sample
+def write_parquet(outname, WINDOWS, SAMPLES_LIST, MATRIX):
+
+	try:
+		import pandas
+	except ImportError:
+		sys.stderr.write("\n# Error: pandas (with pyarrow or fastparquet) is required for --parquet \n")
+		sys.exit(1)
+
+	TABLE = pandas.DataFrame(MATRIX, columns = SAMPLES_LIST)
+	TABLE.insert(0, 'chrom', [WINDOW[0] for WINDOW in WINDOWS])
+	TABLE.insert(1, 'start', [int(WINDOW[1]) for WINDOW in WINDOWS])
+	TABLE.insert(2, 'stop', [int(WINDOW[2]) for WINDOW in WINDOWS])
+	TABLE.to_parquet(outname, index = False)
 
 
 	
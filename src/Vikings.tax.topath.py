@@ -15,6 +15,9 @@ Andrea Del Cortona
 
 import argparse
 import functools
+import glob
+import itertools
+import multiprocessing
 #import numpy
 import os
 #import pandas
@@ -23,8 +26,8 @@ import shutil
 import string
 import sys
 import csv
-from ete3 import NCBITaxa
-ncbi = NCBITaxa()
+from vikingslib import tabix
+from vikingslib import taxonomy
 
 
 ####################################################################
@@ -34,63 +37,313 @@ ncbi = NCBITaxa()
 parser = argparse.ArgumentParser(description='''I assign full taxomonic path to a the DIAMOND output
 
 	usage:
-	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab >> OUTPUT.tab''')
+	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab >> OUTPUT.tab
+
+	With --cache, the lineages are kept in a SQLite file keyed by taxid and reused by later runs and samples.
+	--build_cache fills it once with all the taxids of the ete3 database.
+
+	usage:
+	~/anaconda_ete/bin/python3.6 tax.topath.py --build_cache --cache lineages.sqlite
+	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab --cache lineages.sqlite >> OUTPUT.tab
+
+	With --taxdb, the lineages are read from a flat taxonomy index (numpy arrays + string table, memory-mapped)
+	and ete3 is not loaded: a taxid missing from the index is "taxid not available".
+	--build_taxdb compiles it once from the NCBI taxdump (nodes.dmp, names.dmp, merged.dmp) or from the ete3 taxa.sqlite.
+
+	usage:
+	~/anaconda_ete/bin/python3.6 tax.topath.py --build_taxdb taxdump/ --taxdb taxdb/
+	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab --taxdb taxdb/ >> OUTPUT.tab
+
+	With --inputs, many DIAMOND tables (paths or quoted globs) are annotated by a pool of --threads processes
+	sharing the taxonomy index. Large tables are split in chunks of --chunk_size MB.
+	Each output is written next to its input, as INPUT.tax.
+
+	usage:
+	~/anaconda_ete/bin/python3.6 tax.topath.py --inputs "*.diamond" --taxdb taxdb/ --threads 16
+
+	With --taxdb, --ranks gives one column per rank (superkingdom, phylum, class, order, family, genus, species)
+	instead of the full lineage, --lca uses the lowest common ancestor of all the taxids of a hit
+	instead of the first one, and --top N gives one line per protein, with the lowest common ancestor of its first N hits.
+
+	usage:
+	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab --taxdb taxdb/ --ranks --lca --top 5 >> OUTPUT.tab''')
 
 parser.add_argument("--input",
 	metavar='INPUT',
 	action = 'store',
 	type = str,
 	dest = 'INPUT',
-	help = 'the DIAMOND.output.tab input file in format 6, with taxid as last (13th) column',
-	required = True)
+	help = 'the DIAMOND.output.tab input file in format 6, with taxid as last (13th) column')
+
+parser.add_argument("--inputs",
+	metavar='INPUTS',
+	action = 'store',
+	type = str,
+	nargs = '+',
+	dest = 'INPUTS',
+	help = 'many DIAMOND.output.tab files or globs, each annotated into INPUT.tax')
+
+parser.add_argument("--threads",
+	metavar='THREADS',
+	action = 'store',
+	type = int,
+	dest = 'THREADS',
+	help = 'number of processes used with --inputs (default: 1)',
+	default = 1)
+
+parser.add_argument("--chunk_size",
+	metavar='CHUNK_SIZE',
+	action = 'store',
+	type = int,
+	dest = 'CHUNK_SIZE',
+	help = 'size in MB of the chunks the --inputs tables are split in (default: 64)',
+	default = 64)
+
+parser.add_argument("--cache",
+	metavar='CACHE',
+	action = 'store',
+	type = str,
+	dest = 'CACHE',
+	help = 'SQLite lineage cache keyed by taxid, created if missing and updated with the new taxids')
+
+parser.add_argument("--build_cache",
+	action = 'store_true',
+	dest = 'BUILD_CACHE',
+	help = 'fill the --cache with all the taxids of the ete3 taxonomy database')
+
+parser.add_argument("--ete3_db",
+	metavar='ETE3_DB',
+	action = 'store',
+	type = str,
+	dest = 'ETE3_DB',
+	help = 'the ete3 taxa.sqlite used by --build_cache (default: ~/.etetoolkit/taxa.sqlite)')
+
+parser.add_argument("--taxdb",
+	metavar='TAXDB',
+	action = 'store',
+	type = str,
+	dest = 'TAXDB',
+	help = 'directory of the flat taxonomy index built by --build_taxdb, lineages are resolved without ete3')
+
+parser.add_argument("--build_taxdb",
+	metavar='TAXDUMP',
+	action = 'store',
+	type = str,
+	dest = 'BUILD_TAXDB',
+	help = 'compile the NCBI taxdump directory (nodes.dmp, names.dmp, merged.dmp) or the ete3 taxa.sqlite into --taxdb')
+
+parser.add_argument("--ranks",
+	metavar='RANKS',
+	action = 'store',
+	type = str,
+	nargs = '*',
+	dest = 'RANKS',
+	help = 'one column per rank instead of the full lineage (default ranks: ' + ' '.join(taxonomy.RANKS) + '), needs --taxdb')
+
+parser.add_argument("--lca",
+	action = 'store_true',
+	dest = 'LCA',
+	help = 'use the lowest common ancestor of all the taxids of a hit instead of the first one, needs --taxdb')
+
+parser.add_argument("--top",
+	metavar='TOP',
+	action = 'store',
+	type = int,
+	dest = 'TOP',
+	help = 'one line per protein with the lowest common ancestor of its first TOP hits, needs --taxdb')
 
 args = parser.parse_args()
 
+if args.INPUT is None and args.INPUTS is None and not args.BUILD_CACHE and args.BUILD_TAXDB is None:
+	parser.error('one of the arguments --input --inputs is required')
+if args.INPUT is not None and args.INPUTS is not None:
+	parser.error('--input and --inputs are mutually exclusive')
+if args.BUILD_CACHE and args.CACHE is None:
+	parser.error('--build_cache requires --cache')
+if args.BUILD_TAXDB is not None and args.TAXDB is None:
+	parser.error('--build_taxdb requires --taxdb')
+if (args.RANKS is not None or args.LCA or args.TOP is not None) and args.TAXDB is None:
+	parser.error('--ranks, --lca and --top require --taxdb')
+if args.TOP is not None and args.TOP < 1:
+	parser.error('--top must be at least 1')
+if args.RANKS is not None and len(args.RANKS) == 0:
+	args.RANKS = taxonomy.RANKS
+
 
 ####################################################################
 ### FUNCTIONS ######################################################
 ####################################################################
 
+# LCA of the staxids strings already seen
+LCA_MEMO = {}
+
 def get_desired_ranks(taxid):
-	lineage = ncbi.get_lineage(taxid)
-	names = ncbi.get_taxid_translator(lineage)
-	return [names[taxid] for taxid in lineage]
+	return taxonomy.get_lineage_names(resolver, taxid)
 
 def main(taxids):
 	mytax = get_desired_ranks(taxids)
 	return mytax
 
+# lineage of the first taxid (or of the LCA) of a DIAMOND hit, preceded by query and subject
+def tax_hit(prot, AC, staxids):
 
-####################################################################
-### RUN ############################################################
-####################################################################
+	mytax = tax_names(hit_taxid(staxids))
+	mytax.insert(0, AC)
+	mytax.insert(0, prot)
+
+	return mytax
+
+# lineage of the LCA of the first TOP hits of a protein, preceded by the protein
+def tax_protein(prot, hits):
+
+	taxids = [hit_taxid(staxids) for AC, staxids in itertools.islice(hits, args.TOP)]
+	lca = taxonomy.flat_lca(resolver["index"], [taxid for taxid in taxids if taxid != ''])
+	mytax = tax_names(str(lca) if lca >= 0 else '')
+	mytax.insert(0, prot)
+
+	return mytax
+
+# taxid of a DIAMOND hit: the first of staxids, or their LCA with --lca
+def hit_taxid(staxids):
+
+	if args.LCA:
+		if staxids not in LCA_MEMO:
+			lca = taxonomy.flat_lca(resolver["index"], [taxid for taxid in staxids.split(";") if taxid != ''])
+			LCA_MEMO[staxids] = str(lca) if lca >= 0 else ''
+		return LCA_MEMO[staxids]
+
+	main_taxid, *throwaway = staxids.split(";")
+
+	return main_taxid
+
+# full lineage, or the --ranks columns, of a taxid
+def tax_names(taxid):
+
+	if taxid == '':
+		return not_available()
+
+	if args.RANKS is not None:
+		mytax = taxonomy.flat_rank_names(resolver["index"], int(taxid), args.RANKS)
+		return mytax if mytax is not None else not_available()
+
+	# generates the lineage, a taxid missing from --taxdb is not available
+	mytax = main(taxid)
+	return mytax if mytax is not None else not_available()
+
+# missing taxid: the marker, then NA in the other --ranks columns so that the table stays rectangular
+def not_available():
 
-with open(args.INPUT, 'r') as input_file:
+	if args.RANKS is not None:
+		return ["taxid not available"] + ["NA"] * (len(args.RANKS) - 1)
 
-	for line in input_file:
-		
+	return ["taxid not available"]
+
+# output rows of the lines of a DIAMOND table: one per hit, or one per protein with --top
+def tax_rows(lines):
+
+	hits = read_hits(lines)
+	if args.TOP is None:
+		for prot, AC, staxids in hits:
+			yield tax_hit(prot, AC, staxids)
+	else:
+		# the hits of a protein are consecutive in the DIAMOND output
+		for prot, group in itertools.groupby(hits, key = lambda hit: hit[0]):
+			yield tax_protein(prot, ((AC, staxids) for query, AC, staxids in group))
+
+# query, subject and taxids of the lines of a DIAMOND table, split line by line:
+# faster here than the block reader of vikingslib.diamond (see benchmarks/vikingslib.diamond.bench.py)
+def read_hits(lines):
+
+	for line in lines:
 		line = line.rstrip('\n')
 		prot, AC, pident, length, mismatch, gapopen, qstart, qend, sstart, send, evalue, bitscore, staxids = line.split('\t')
-		main_taxid, *throwaway = staxids.split(";") 		
+		yield prot, AC, staxids
+
+# annotate one DIAMOND table to stdout
+def run_input(INPUT):
+
+	with open(INPUT) as input_file:
+		for mytax in tax_rows(input_file):
+			print(*mytax, sep = '\t')
+
+# list the DIAMOND tables of --inputs, globs expanded
+def list_inputs(INPUTS):
+
+	FILES = []
+	for PATTERN in INPUTS:
+		MATCHES = sorted(glob.glob(PATTERN))
+		if len(MATCHES) == 0:
+			sys.stderr.write("# Warning: no file matches %s\n" % PATTERN)
+		for FILE in MATCHES:
+			if FILE not in FILES:
+				FILES.append(FILE)
+
+	return FILES
+
+# annotate many DIAMOND tables, sharded by file and by chunks of lines, in a process pool
+def run_inputs(INPUTS, THREADS, CHUNK_SIZE):
 
-		if main_taxid != '':
+	TASKS = []
+	for INPUT in list_inputs(INPUTS):
+		# with --top the hits of a protein must stay together: tables are not split
+		if args.TOP is not None:
+			TASKS.append((INPUT, 0, os.path.getsize(INPUT)))
+			continue
+		for START, STOP in tabix.byte_ranges(INPUT, CHUNK_SIZE * 1024 * 1024):
+			TASKS.append((INPUT, START, STOP))
 
-			# generates the lineage
-			taxids = main_taxid
-			mytax = main(taxids)		
-		
-			# print output
-			mytax.insert(0, AC)
-			mytax.insert(0, prot)		
-			print(*mytax, sep = '\t')	
+	# the chunks come back in order: outputs are written one file after the other
+	outfile = None
+	with multiprocessing.Pool(THREADS, initializer = init_worker, initargs = (args.CACHE, args.TAXDB)) as pool:
+		for INPUT, START, TEXT in pool.imap(tax_chunk, TASKS):
+			if START == 0:
+				if outfile is not None:
+					outfile.close()
+				outfile = open(INPUT + '.tax', 'w')
+				sys.stderr.write("# %s -> %s\n" % (INPUT, INPUT + '.tax'))
+			outfile.write(TEXT)
+	if outfile is not None:
+		outfile.close()
 
-		else:
+# every worker maps the same taxonomy index, the cache is only read
+def init_worker(CACHE, TAXDB):
+
+	global resolver
+	resolver = taxonomy.new_resolver(CACHE, TAXDB, read_only = True)
+
+# annotate the lines of a table starting in a byte range
+def tax_chunk(TASK):
+
+	INPUT, START, STOP = TASK
+	OUT = []
+	for mytax in tax_rows(tabix.read_range(INPUT, START, STOP)):
+		OUT.append('\t'.join(mytax) + '\n')
+
+	return (INPUT, START, ''.join(OUT))
+
+
+####################################################################
+### RUN ############################################################
+####################################################################
 
-			mytax = ["taxid not available"]
-			mytax.insert(0, AC)
-			mytax.insert(0, prot)		
-			print(*mytax, sep = '\t')	
+if __name__ == '__main__':
 
+	if args.BUILD_TAXDB is not None:
+		n = taxonomy.build_flat_index(args.BUILD_TAXDB, args.TAXDB)
+		sys.stderr.write("# %d taxids written to %s\n" % (n, args.TAXDB))
 
+	if args.BUILD_CACHE:
+		n = taxonomy.build_cache(args.CACHE, args.ETE3_DB)
+		sys.stderr.write("# %d lineages written to %s\n" % (n, args.CACHE))
 
+	if args.INPUTS is not None:
+		# the cache must exist before the workers open it read only
+		if args.CACHE is not None:
+			taxonomy.open_cache(args.CACHE).close()
+		run_inputs(args.INPUTS, args.THREADS, args.CHUNK_SIZE)
 
+	elif args.INPUT is not None:
+		# lineages are resolved once per taxid: memo, then flat index, then cache, then ete3 (only without --taxdb)
+		resolver = taxonomy.new_resolver(args.CACHE, args.TAXDB)
+		run_input(args.INPUT)
+		taxonomy.close_resolver(resolver)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3.5
+
+'''
+___________________________________________________
+
+I benchmark CNVnator_merger.py on synthetic CNVnator calls.
+I check that the output is identical to the original nested loop on a small input,
+then I time the script on large inputs (100k calls per bin by default).
+___________________________________________________
+'''
+
+
+
+#==================================================================#
+#   LOAD LIBRARIES                                                 #
+#==================================================================#
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+
+
+#==================================================================#
+#   INPUT PARSER                                                   #
+#==================================================================#
+
+parser = argparse.ArgumentParser(description='''I benchmark CNVnator_merger.py on synthetic CNVnator calls.
+
+	usage:
+	python3.5 CNVnator_merger.bench.py --calls 100000 --check_calls 2000''')
+
+parser.add_argument("--calls",
+	metavar ='CALLS',
+	action = 'store',
+	type = int,
+	dest = 'CALLS',
+	help = 'Number of calls per synthetic input (default: 100000).',
+	default = 100000)
+
+parser.add_argument("--check_calls",
+	metavar ='CHECK_CALLS',
+	action = 'store',
+	type = int,
+	dest = 'CHECK_CALLS',
+	help = 'Number of calls per input for the comparison with the original loop (default: 2000).',
+	default = 2000)
+
+parser.add_argument("--seed",
+	metavar ='SEED',
+	action = 'store',
+	type = int,
+	dest = 'SEED',
+	help = 'Random seed (default: 42).',
+	default = 42)
+
+args = parser.parse_args()
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CNVnator_merger.py')
+CHR_LIST = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII", "XIII", "XIV", "XV", "XVI"]
+
+
+
+#==================================================================#
+#   FUNCTIONS                                                      #
+#==================================================================#
+
+# run the comparison and the benchmark
+def main():
+
+	random.seed(args.SEED)
+	with tempfile.TemporaryDirectory() as tmpdir:
+
+		# output must be identical to the original nested loop
+		INPUT_1 = write_calls(os.path.join(tmpdir, 'check.bin1.tab'), args.CHECK_CALLS, 500)
+		INPUT_2 = write_calls(os.path.join(tmpdir, 'check.bin2.tab'), args.CHECK_CALLS, 1000)
+		NEW, dt = run_script(INPUT_1, INPUT_2)
+		OLD = legacy_merge(INPUT_1, INPUT_2, 'bench')
+		if NEW != OLD:
+			sys.stderr.write("# ERROR: output differs from the original nested loop\n")
+			sys.exit(1)
+		print('\t'.join(['check', str(args.CHECK_CALLS), str(len(OLD.splitlines())) + ' rows', 'identical']))
+
+		# time the large inputs
+		INPUT_1 = write_calls(os.path.join(tmpdir, 'bench.bin1.tab'), args.CALLS, 500)
+		INPUT_2 = write_calls(os.path.join(tmpdir, 'bench.bin2.tab'), args.CALLS, 1000)
+		NEW, dt = run_script(INPUT_1, INPUT_2)
+		SECONDS = dt.total_seconds()
+		print('\t'.join(['bench', str(args.CALLS), str(len(NEW.splitlines())) + ' rows', '%.2f s' % SECONDS, '%.0f calls/s' % (2 * args.CALLS / SECONDS)]))
+
+
+
+# write a synthetic CNVnator output, calls are spread on the chromosomes
+def write_calls(outname, CALLS, BIN):
+
+	PER_CHR = max(1, CALLS // len(CHR_LIST))
+	with open(outname, 'w') as outfile:
+		n = 0
+		for CHR in CHR_LIST:
+			POS = 1
+			for k in range(PER_CHR):
+				if n == CALLS:
+					break
+				POS = max(1, POS + random.randint(-3, 4) * BIN)
+				LENGTH = random.randint(1, 20) * BIN
+				KIND = random.choice(['deletion', 'duplication'])
+				NORM_RD = random.uniform(0, 4)
+				EVAL1 = random.choice([1e-11, 0.001, 0.01, 0.2])
+				outfile.write('\t'.join([KIND, '%s:%d-%d' % (CHR, POS, POS + LENGTH - 1), str(LENGTH), str(NORM_RD), str(EVAL1), '0', str(EVAL1), '0', '1']) + '\n')
+				POS += LENGTH
+				n += 1
+
+	return(outname)
+
+
+
+# run CNVnator_merger.py and return its output and running time
+def run_script(INPUT_1, INPUT_2):
+
+	t0 = datetime.now()
+	OUT = subprocess.run([sys.executable, SCRIPT, '--input_1', INPUT_1, '--input_2', INPUT_2, '--sample', 'bench'],
+		stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, check = True, universal_newlines = True).stdout
+	dt = datetime.now() - t0
+
+	return(OUT, dt)
+
+
+
+# the original all-against-all loop of CNVnator_merger.py
+def legacy_merge(INPUT_1, INPUT_2, SAMPLE):
+
+	def read_table(infile):
+		IN_DB = {}
+		for line in open(infile):
+			KIND, LOCUS, LENGTH, NORM_RD, EVAL1, EVAL2, EVAL3, EVAL4, QUAL = line.rstrip('\n').split('\t')
+			CHR, COHORD = LOCUS.split(':')
+			START, STOP = COHORD.split('-')
+			if float(EVAL1) < 0.05:
+				IN_DB.setdefault(CHR, []).append([START, STOP, KIND, NORM_RD, EVAL1])
+		return(IN_DB)
+
+	def row(CHR, START, STOP, KIND, NORM_RD1, NORM_RD2):
+		return('\t'.join([SAMPLE, CHR, START, STOP, KIND, str(float((float(NORM_RD1) + float(NORM_RD2))/2))]) + '\n')
+
+	INPUT_1_DB = read_table(INPUT_1)
+	INPUT_2_DB = read_table(INPUT_2)
+	OUT = []
+	for KEY in INPUT_1_DB:
+		if KEY in INPUT_2_DB:
+			for R1 in INPUT_1_DB[KEY]:
+				for R2 in INPUT_2_DB[KEY]:
+					if int(R1[1]) < int(R2[0]) or int(R1[0]) > int(R2[1]):
+						continue
+					START = R2[0] if int(R1[0]) <= int(R2[0]) else R1[0]
+					STOP = R1[1] if int(R1[1]) <= int(R2[1]) else R2[1]
+					OUT.append(row(KEY, START, STOP, R1[2], R1[3], R2[3]))
+
+	return(''.join(OUT))
+
+
+
+#==================================================================#
+#   RUN                                                            #
+#==================================================================#
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3.5
+
+'''
+___________________________________________________
+
+I benchmark the HGT scan of Vikings.check_eukbact_contigs.1.py on a synthetic proteome.
+I check that the .HGT.table is identical to the one of the original nested loops, and I time the two:
+--exact_match (the gene -> contigs index) on gene names of the same width (no name is a substring of another),
+and the default regex matching on names of any width (g1 is found in g10).
+I check that --fused writes the .HGT.bactmatch of the original Vikings.Bactmatch.py on the .HGT.table.
+___________________________________________________
+'''
+
+
+
+#==================================================================#
+#   LOAD LIBRARIES                                                 #
+#==================================================================#
+
+import argparse
+import importlib.util
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+
+
+#==================================================================#
+#   INPUT PARSER                                                   #
+#==================================================================#
+
+parser = argparse.ArgumentParser(description='''I benchmark the HGT scan of Vikings.check_eukbact_contigs.1.py on a synthetic proteome.
+
+	usage:
+	python3.5 Vikings.check_eukbact_contigs.1.bench.py --genes 6000''')
+
+parser.add_argument("--genes",
+	metavar ='GENES',
+	action = 'store',
+	type = int,
+	dest = 'GENES',
+	help = 'Number of genes of the proteome (default: 6000).',
+	default = 6000)
+
+parser.add_argument("--bact",
+	metavar ='BACT',
+	action = 'store',
+	type = float,
+	dest = 'BACT',
+	help = 'Fraction of bacterial genes (default: 0.05).',
+	default = 0.05)
+
+parser.add_argument("--seed",
+	metavar ='SEED',
+	action = 'store',
+	type = int,
+	dest = 'SEED',
+	help = 'Random seed (default: 42).',
+	default = 42)
+
+args = parser.parse_args()
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Vikings.check_eukbact_contigs.1.py')
+SAMPLE = 'kveik'
+PREFIX = '{}.SPAdes.redundans.all.maker.proteins.fasta.diamond.tax'.format(SAMPLE)
+LINEAGES = [
+	['cellular organisms', 'Eukaryota', 'Opisthokonta', 'Fungi'],
+	['cellular organisms', 'Eukaryota'],
+	['cellular organisms', 'Bacteria', 'Proteobacteria'],
+	['taxid not available']
+]
+# hits reported at the rank of the kingdom, without accession
+KINGDOMS = [
+	['Eukaryota'],
+	['Bacteria']
+]
+
+
+
+#==================================================================#
+#   FUNCTIONS                                                      #
+#==================================================================#
+
+# write the proteome, run both scans and compare them
+def main():
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+
+		os.chdir(tmpdir)
+		script = load_script()
+		for NAME_FORMAT, EXACT_MATCH in (('{}_g{:07d}', True), ('{}_g{}', False)):
+			random.seed(args.SEED)
+			write_proteome(args.GENES, args.BACT, NAME_FORMAT)
+			compare(script, EXACT_MATCH)
+
+
+
+# run the original loops and the script on the proteome, check and time them
+def compare(script, EXACT_MATCH):
+
+	OUTPUT = PREFIX + '.HGT.table'
+
+	t0 = datetime.now()
+	legacy_hgt(SAMPLE)
+	dt_old = datetime.now() - t0
+	with open(OUTPUT) as infile:
+		OLD = infile.read()
+
+	script.args.EXACT_MATCH = EXACT_MATCH
+	t0 = datetime.now()
+	script.hgt_sample(SAMPLE)
+	dt = datetime.now() - t0
+	with open(OUTPUT) as infile:
+		NEW = infile.read()
+
+	MODE = 'exact_match' if EXACT_MATCH else 'regex match'
+	if NEW != OLD:
+		sys.stderr.write("# ERROR: %s .HGT.table differs from the original loops\n" % MODE)
+		sys.exit(1)
+	print('\t'.join([str(args.GENES) + ' genes', str(len(NEW.splitlines())) + ' rows', 'identical', MODE + ' %.2f s' % dt.total_seconds(), 'original %.2f s' % dt_old.total_seconds()]))
+
+	# --fused against the original Vikings.Bactmatch.py on the .HGT.table
+	OLD = legacy_bactmatch(OUTPUT)
+	script.args.FLANK = 1
+	script.fused_sample(SAMPLE)
+	with open(PREFIX + '.HGT.bactmatch') as infile:
+		NEW = infile.read()
+
+	if NEW != OLD:
+		sys.stderr.write("# ERROR: %s --fused .HGT.bactmatch differs from Vikings.Bactmatch.py\n" % MODE)
+		sys.exit(1)
+	print('\t'.join([str(args.GENES) + ' genes', str(len(NEW.splitlines())) + ' candidates', 'identical', MODE + ' --fused']))
+
+
+
+# write the bacterial list, the taxonomy of the hits and the CDS gff of a synthetic proteome
+def write_proteome(GENES, BACT, NAME_FORMAT):
+
+	NAMES = []
+	with open('{}.SPAdes.redundans.all.CDSonly.gff'.format(SAMPLE), 'w') as outfile:
+		CONTIG = 0
+		POS = 0
+		for k in range(GENES):
+			if random.random() < 0.02:
+				CONTIG += 1
+				POS = 0
+			POS += random.randint(200, 3000)
+			NAME = NAME_FORMAT.format(SAMPLE, k)
+			NAMES.append(NAME)
+			outfile.write('\t'.join(['NODE_%d' % CONTIG, 'maker', 'CDS', str(POS), str(POS + 1200), '.', random.choice('+-'), '0',
+				'ID={}|{}-mRNA-1:cds;Parent={}-mRNA-1'.format(NAME, NAME, NAME)]) + '\n')
+
+	with open(PREFIX + '.bact.lst', 'w') as outfile:
+		for NAME in random.sample(NAMES, int(GENES * BACT)):
+			outfile.write(NAME + '|' + NAME + '-mRNA-1\n')
+
+	with open(PREFIX + '.all', 'w') as outfile:
+		for NAME in NAMES:
+			for k in range(random.choice([0, 1, 1, 2, 3])):
+				if random.random() < 0.5:
+					outfile.write('\t'.join([NAME + '|' + NAME + '-mRNA-1'] + random.choice(KINGDOMS)) + '\n')
+				else:
+					outfile.write('\t'.join([NAME + '|' + NAME + '-mRNA-1', 'AC%d' % k] + random.choice(LINEAGES)) + '\n')
+
+
+
+# load Vikings.check_eukbact_contigs.1.py as a module
+def load_script():
+
+	spec = importlib.util.spec_from_file_location('check_eukbact_contigs', SCRIPT)
+	script = importlib.util.module_from_spec(spec)
+	ARGV = sys.argv
+	sys.argv = [SCRIPT, '--input', 'samples.lst']
+	sys.path.insert(0, os.path.dirname(SCRIPT))
+	spec.loader.exec_module(script)
+	sys.argv = ARGV
+
+	return(script)
+
+
+
+# the original nested loops of Vikings.check_eukbact_contigs.1.py
+def legacy_hgt(sample):
+
+	BACT_LIST = []
+	with open(PREFIX + '.bact.lst') as bactfile:
+		for line in bactfile:
+			BACT_LIST.append(line.rstrip('\n').split("|", 1)[0])
+
+	CONTIG_LIST = []
+	GENOME_CONT = {}
+	with open('{}.SPAdes.redundans.all.CDSonly.gff'.format(sample)) as annotfile:
+		for line in annotfile:
+			POS1, POS2, POS3, POS4, POS5, POS6, POS7, POS8, POS9 = line.rstrip('\n').split('\t')
+			ADD_GENE = re.sub(r"ID=", "", POS9)
+			ADD_GENE = re.sub(r"\:cds\;.*", "", ADD_GENE)
+			GENOME_CONT.setdefault(POS1, []).append(ADD_GENE.split("|", 1)[0])
+
+	for BACT in BACT_LIST:
+		for k in GENOME_CONT:
+			for y in GENOME_CONT[k]:
+				if re.search(BACT, y):
+					CONTIG_LIST.append(k)
+
+	WHOLE_TAX = []
+	with open(PREFIX + '.all') as taxfile:
+		for line in taxfile:
+			GENE, *TAX = line.rstrip('\n').split('\t')
+			WHOLE_TAX.append([GENE.split("|", 1)[0], TAX])
+
+	with open(PREFIX + '.HGT.table', 'w+') as outfile:
+		for CONTIG in CONTIG_LIST:
+			for GENE in GENOME_CONT[CONTIG]:
+				if GENE in BACT_LIST:
+					outfile.write(CONTIG + '\t' + GENE + '\t' + "match" + '\n')
+				else:
+					for INFO in WHOLE_TAX:
+						if GENE == INFO[0]:
+							outfile.write(CONTIG + '\t' + GENE + '\t' + str(INFO[1]) + '\n')
+
+
+# the original loop of Vikings.Bactmatch.py on a .HGT.table, without the wrap around of the first and last rows
+def legacy_bactmatch(table):
+
+	INPUT_DB = []
+	with open(table) as infile:
+		for line in infile:
+			CHR, GENE, FEAT = line.rstrip('\n').split('\t')
+			INPUT_DB.append([CHR, GENE, FEAT])
+
+	OUTPUT = []
+	for k in range(len(INPUT_DB)):
+		if INPUT_DB[k][2] == "match":
+			if k > 0 and INPUT_DB[k][0] == INPUT_DB[k-1][0] and INPUT_DB[k-1][2] == "['Eukaryota']":
+				OUTPUT.append('\t'.join(INPUT_DB[k]) + '\n')
+			elif k + 1 < len(INPUT_DB) and INPUT_DB[k][0] == INPUT_DB[k+1][0] and INPUT_DB[k+1][2] == "['Eukaryota']":
+				OUTPUT.append('\t'.join(INPUT_DB[k]) + '\n')
+
+	return(''.join(OUTPUT))
+
+
+
+#==================================================================#
+#   RUN                                                            #
+#==================================================================#
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3.5
+
+'''
+___________________________________________________
+
+I check Vikings.domesticationVCFparser.py --region on a synthetic whole-genome VCF.
+The output read through the tabix index must be identical to the full scan of the plain VCF.
+I also time the two paths.
+bgzip and tabix (htslib) or pysam are needed to build the indexed fixture.
+___________________________________________________
+'''
+
+
+
+#==================================================================#
+#   LOAD LIBRARIES                                                 #
+#==================================================================#
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+
+
+#==================================================================#
+#   INPUT PARSER                                                   #
+#==================================================================#
+
+parser = argparse.ArgumentParser(description='''I check and time Vikings.domesticationVCFparser.py --region on a synthetic whole-genome VCF.
+
+	usage:
+	python3.5 Vikings.domesticationVCFparser.bench.py --records 50000 --samples 50''')
+
+parser.add_argument("--records",
+	metavar ='RECORDS',
+	action = 'store',
+	type = int,
+	dest = 'RECORDS',
+	help = 'Number of VCF records per chromosome (default: 50000).',
+	default = 50000)
+
+parser.add_argument("--samples",
+	metavar ='SAMPLES',
+	action = 'store',
+	type = int,
+	dest = 'SAMPLES',
+	help = 'Number of samples (default: 50).',
+	default = 50)
+
+parser.add_argument("--seed",
+	metavar ='SEED',
+	action = 'store',
+	type = int,
+	dest = 'SEED',
+	help = 'Random seed (default: 42).',
+	default = 42)
+
+args = parser.parse_args()
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Vikings.domesticationVCFparser.py')
+CHR_LIST = ["I", "II", "III", "IV"]
+FORMATS = ["GT"] * 3 + ["GT:DP"] * 8 + ["GT:AD:DP"] + ["GT:AD:DP:GQ"] * 2 + ["GT:AD:DP:GQ:PL"] * 3
+FIELDS = {
+	"GT": ["./."],
+	"GT:DP": ["0/0:10", "./.:.", "0/0:5"],
+	"GT:AD:DP": ["0/0:1,0:1"],
+	"GT:AD:DP:GQ": ["./.:.:.:.", "0/0:5,0:5:20", "1/2:1,2:3:10", "0/2:1,1:2:9"],
+	"GT:AD:DP:GQ:PL": ["./.:.:.:.:.", "0/0:5,0:5:20:0,10,100", "0/1:3,3:6:40:40,0,40", "1/1:0,5:5:15:100,15,0"]
+}
+
+
+
+#==================================================================#
+#   FUNCTIONS                                                      #
+#==================================================================#
+
+# build the fixture, compare the two paths on a few regions and time them
+def main():
+
+	random.seed(args.SEED)
+	with tempfile.TemporaryDirectory() as tmpdir:
+
+		VCF, LENGTH = write_vcf(os.path.join(tmpdir, 'genome.vcf'), args.RECORDS, args.SAMPLES)
+		VCF_GZ = index_vcf(VCF)
+		SAMPLES = os.path.join(tmpdir, 'samples.txt')
+		with open(SAMPLES, 'w') as outfile:
+			for k in range(args.SAMPLES):
+				outfile.write('S%03d\tKveik\n' % k)
+
+		REGIONS = ["%s:%d-%d" % (random.choice(CHR_LIST), START, START + random.randint(1, 5000)) for START in random.sample(range(1, LENGTH), 10)]
+		REGIONS += ["I:1-1", "II:%d-%d" % (LENGTH - 100, LENGTH + 100), "chrMissing:1-1000", "III"]
+		for REGION in REGIONS:
+			INDEXED, dt_indexed = run_script(VCF_GZ, REGION, SAMPLES)
+			SCAN, dt_scan = run_script(VCF, REGION, SAMPLES)
+			if INDEXED != SCAN:
+				sys.stderr.write("# ERROR: indexed and full scan outputs differ for %s\n" % REGION)
+				sys.exit(1)
+			print('\t'.join([REGION, str(len(SCAN.splitlines())) + ' rows', 'identical', 'indexed %.2f s' % dt_indexed.total_seconds(), 'full scan %.2f s' % dt_scan.total_seconds()]))
+
+
+
+# write a synthetic whole-genome VCF with the FORMAT fields of the GATK joint calling
+def write_vcf(outname, RECORDS, SAMPLES):
+
+	with open(outname, 'w') as outfile:
+		outfile.write('##fileformat=VCFv4.2\n')
+		outfile.write('\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT'] + ['S%03d' % k for k in range(SAMPLES)]) + '\n')
+		for CHR in CHR_LIST:
+			POS = 0
+			for k in range(RECORDS):
+				POS += random.randint(1, 5)
+				FORMAT = random.choice(FORMATS)
+				CALLS = [random.choice(FIELDS[FORMAT]) for x in range(SAMPLES)]
+				outfile.write('\t'.join([CHR, str(POS), '.', random.choice(['A', 'C', 'GT']), 'C', '50', 'PASS', '.', FORMAT] + CALLS) + '\n')
+
+	return(outname, POS)
+
+
+
+# bgzip compress and tabix index the VCF, with htslib or pysam
+def index_vcf(VCF):
+
+	if shutil.which('bgzip') and shutil.which('tabix'):
+		subprocess.run('bgzip -c %s > %s.gz' % (VCF, VCF), shell = True, check = True)
+		subprocess.run(['tabix', '-p', 'vcf', VCF + '.gz'], check = True)
+	else:
+		try:
+			import pysam
+		except ImportError:
+			sys.stderr.write("# ERROR: bgzip and tabix (htslib) or pysam are needed to index the fixture\n")
+			sys.exit(1)
+		pysam.tabix_compress(VCF, VCF + '.gz', force = True)
+		pysam.tabix_index(VCF + '.gz', preset = 'vcf', force = True)
+
+	return(VCF + '.gz')
+
+
+
+# run Vikings.domesticationVCFparser.py on a region and return its output and running time
+def run_script(VCF, REGION, SAMPLES):
+
+	t0 = datetime.now()
+	OUT = subprocess.run([sys.executable, SCRIPT, '--input', VCF, '--region', REGION, '--name', 'bench.GENE', '--samples', SAMPLES],
+		stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, check = True, universal_newlines = True).stdout
+	dt = datetime.now() - t0
+
+	return(OUT, dt)
+
+
+
+#==================================================================#
+#   RUN                                                            #
+#==================================================================#
+
+if __name__ == '__main__':
+	main()
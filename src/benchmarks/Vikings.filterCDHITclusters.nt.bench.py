@@ -0,0 +1,203 @@
+#!/usr/bin/env python3.5
+
+'''
+___________________________________________________
+
+I benchmark the name check and the subcluster assignment of Vikings.filterCDHITclusters.nt.py
+on one synthetic CD-HIT cluster with many members.
+I check that the subclusters are identical to the ones of the original list scans,
+and I time the two.
+___________________________________________________
+'''
+
+
+
+#==================================================================#
+#   LOAD LIBRARIES                                                 #
+#==================================================================#
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+
+
+
+#==================================================================#
+#   INPUT PARSER                                                   #
+#==================================================================#
+
+parser = argparse.ArgumentParser(description='''I benchmark the subcluster assignment of Vikings.filterCDHITclusters.nt.py on one large cluster.
+
+	usage:
+	python3.5 Vikings.filterCDHITclusters.nt.bench.py --members 50000''')
+
+parser.add_argument("--members",
+	metavar ='MEMBERS',
+	action = 'store',
+	type = int,
+	dest = 'MEMBERS',
+	help = 'Number of members of the cluster (default: 50000).',
+	default = 50000)
+
+parser.add_argument("--seed",
+	metavar ='SEED',
+	action = 'store',
+	type = int,
+	dest = 'SEED',
+	help = 'Random seed (default: 42).',
+	default = 42)
+
+args = parser.parse_args()
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Vikings.filterCDHITclusters.nt.py')
+
+
+
+#==================================================================#
+#   FUNCTIONS                                                      #
+#==================================================================#
+
+# write the cluster, run both versions and compare them
+def main():
+
+	random.seed(args.SEED)
+	with tempfile.TemporaryDirectory() as tmpdir:
+
+		CLSTR = write_cluster(os.path.join(tmpdir, 'all_plusKV.nt.098.fa.clstr'), args.MEMBERS)
+
+		t0 = datetime.now()
+		raw_clstrDB = legacy_read(CLSTR)
+		dt_old_read = datetime.now() - t0
+		t0 = datetime.now()
+		OLD = legacy_process(raw_clstrDB)
+		dt_old = datetime.now() - t0
+
+		script = load_script(CLSTR)
+		t0 = datetime.now()
+		clusters = list(script.read_clstr(CLSTR))
+		dt_read = datetime.now() - t0
+		t0 = datetime.now()
+		NEW = []
+		for clstr in clusters:
+			for newClstr, members in script.process_clstr(clstr):
+				NEW.append([clstr["names"][k] for k in members])
+		dt = datetime.now() - t0
+
+		if NEW != OLD:
+			sys.stderr.write("# ERROR: the subclusters differ from the original list scans\n")
+			sys.exit(1)
+		print('\t'.join([str(args.MEMBERS) + ' members', str(len(NEW)) + ' subclusters', 'identical',
+			'read + name check %.2f s (original %.2f s)' % (dt_read.total_seconds(), dt_old_read.total_seconds()),
+			'subclusters %.2f s (original %.2f s)' % (dt.total_seconds(), dt_old.total_seconds())]))
+
+
+
+# write one cluster with members spread over lengths and %id, so that it splits in many subclusters
+def write_cluster(outname, MEMBERS):
+
+	LenR = 1500
+	with open(outname, 'w') as outfile:
+		outfile.write('>Cluster 0\n')
+		outfile.write('0\t%daa, >S288C_g0000000... *\n' % LenR)
+		for k in range(1, MEMBERS):
+			Len = int(LenR * random.choice([random.uniform(0.95, 1.05), random.uniform(0.05, 3.0)]))
+			pid = random.choice([random.uniform(95.0, 100.0), random.uniform(40.0, 100.0)])
+			outfile.write('%d\t%daa, >S%d_g%07d... at %.2f%%\n' % (k, max(Len, 1), random.randint(1, 9), k, pid))
+
+	return(outname)
+
+
+
+# load Vikings.filterCDHITclusters.nt.py as a module
+def load_script(CLSTR):
+
+	spec = importlib.util.spec_from_file_location('filterCDHITclusters_nt', SCRIPT)
+	script = importlib.util.module_from_spec(spec)
+	ARGV = sys.argv
+	sys.argv = [SCRIPT, '--clstr', CLSTR]
+	sys.path.insert(0, os.path.dirname(SCRIPT))
+	spec.loader.exec_module(script)
+	sys.argv = ARGV
+
+	return(script)
+
+
+
+# the original read_clstr of Vikings.filterCDHITclusters.nt.py, with the name check on a list
+def legacy_read(input):
+
+	raw_clstrDB = {}
+	with open(input) as infile:
+		for line in infile:
+			line = line.rstrip('\n')
+			if line[0] == ">":
+				curr_clstr = line[1:]
+				raw_clstrDB[curr_clstr] = [[]]
+			else:
+				Num, Info = line.split('\t')
+				LenRaw, NameRaw, *pidRaw = Info.split(' ')
+				Len = LenRaw.replace(',', '').replace('aa', '')
+				Name = NameRaw.replace('>', '').replace('...', '')
+				if pidRaw == ["*"]:
+					raw_clstrDB[curr_clstr][0] = [Name, Len, "100.00"]
+				else:
+					pid = pidRaw[1].replace('%', '')
+					raw_clstrDB[curr_clstr].append([Name, Len, pid])
+
+	for clstr in raw_clstrDB:
+		NamesDB = []
+		for entry in raw_clstrDB[clstr]:
+			if entry[0] in NamesDB:
+				sys.stderr.write("\n# Error: the sequence {} is present more than once in cluster {} \n".format(entry[0], clstr))
+			else:
+				NamesDB.append(entry[0])
+
+	return(raw_clstrDB)
+
+
+
+# the original process_clstr of Vikings.filterCDHITclusters.nt.py, with the linear scan of the seeds
+def legacy_process(raw_clstrDB):
+
+	clean_clstrDB = []
+	for clstr in raw_clstrDB:
+		i = 0
+		tmp_clstr = {}
+		NameR = raw_clstrDB[clstr][0][0]
+		LenR = raw_clstrDB[clstr][0][1]
+		pidR = raw_clstrDB[clstr][0][2]
+		tmp_clstr[i] = [[NameR, LenR, pidR]]
+		for k in range(len(raw_clstrDB[clstr]) - 1):
+			Name = raw_clstrDB[clstr][k][0]
+			Len = raw_clstrDB[clstr][k][1]
+			pid = raw_clstrDB[clstr][k][2]
+			if float(pid) > float(95) and (float(Len) > float(LenR)*0.95 and float(Len) < float(LenR)*1.05):
+				tmp_clstr[0].append([Name, Len, pid])
+			else:
+				isnewClstr = True
+				for j in range(len(tmp_clstr) - 1):
+					if (float(pid) >= float(tmp_clstr[j][0][2])*0.95 and float(pid) <= float(tmp_clstr[j][0][2])*1.05) and \
+						(float(Len) >= float(tmp_clstr[j][0][1])*0.95 and float(Len) <= float(tmp_clstr[j][0][1])*1.05):
+						tmp_clstr[j].append([Name, Len, pid])
+						isnewClstr = False
+						break
+				if isnewClstr == True:
+					i = i + 1
+					tmp_clstr[i] = [[Name, Len, pid]]
+		for newClstr in tmp_clstr:
+			clean_clstrDB.append([entry[0] for entry in tmp_clstr[newClstr]])
+
+	return(clean_clstrDB)
+
+
+
+#==================================================================#
+#   RUN                                                            #
+#==================================================================#
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3.5
+
+'''
+___________________________________________________
+
+I benchmark Vikings.overlapCNVs.py on synthetic CNV calls.
+I check that the output is identical to the original window/sample loop on a small input,
+then I time the script with an increasing number of samples.
+___________________________________________________
+'''
+
+
+
+#==================================================================#
+#   LOAD LIBRARIES                                                 #
+#==================================================================#
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+
+
+#==================================================================#
+#   INPUT PARSER                                                   #
+#==================================================================#
+
+parser = argparse.ArgumentParser(description='''I benchmark Vikings.overlapCNVs.py on synthetic CNV calls.
+
+	usage:
+	python3.5 Vikings.overlapCNVs.bench.py --samples 50 100 200 400 --cnvs 60''')
+
+parser.add_argument("--samples",
+	metavar ='SAMPLES',
+	action = 'store',
+	type = int,
+	nargs = '+',
+	dest = 'SAMPLES',
+	help = 'Numbers of samples to benchmark (default: 50 100 200 400).',
+	default = [50, 100, 200, 400])
+
+parser.add_argument("--cnvs",
+	metavar ='CNVS',
+	action = 'store',
+	type = int,
+	dest = 'CNVS',
+	help = 'Number of CNVs per sample and chromosome, at most 200 (default: 60).',
+	default = 60)
+
+parser.add_argument("--check_samples",
+	metavar ='CHECK_SAMPLES',
+	action = 'store',
+	type = int,
+	dest = 'CHECK_SAMPLES',
+	help = 'Number of samples for the comparison with the original loop (default: 20).',
+	default = 20)
+
+parser.add_argument("--seed",
+	metavar ='SEED',
+	action = 'store',
+	type = int,
+	dest = 'SEED',
+	help = 'Random seed (default: 42).',
+	default = 42)
+
+args = parser.parse_args()
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Vikings.overlapCNVs.py')
+LOCI = 200
+CHR_LIST = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII", "XIII", "XIV", "XV", "XVI", "Mito"]
+
+
+
+#==================================================================#
+#   FUNCTIONS                                                      #
+#==================================================================#
+
+# run the comparison and the benchmark
+def main():
+
+	random.seed(args.SEED)
+	with tempfile.TemporaryDirectory() as tmpdir:
+
+		# output must be identical to the original loop
+		CNVS, BED = write_inputs(tmpdir, args.CHECK_SAMPLES, args.CNVS)
+		NEW, dt = run_script(CNVS, BED)
+		t0 = datetime.now()
+		OLD = legacy_overlap(CNVS, BED)
+		dt_old = datetime.now() - t0
+		if NEW != OLD:
+			sys.stderr.write("# ERROR: output differs from the original loop\n")
+			sys.exit(1)
+		print('\t'.join(['check', str(args.CHECK_SAMPLES) + ' samples', 'identical', 'indexed %.2f s' % dt.total_seconds(), 'original %.2f s' % dt_old.total_seconds()]))
+
+		# scaling with the number of samples
+		for N in args.SAMPLES:
+			CNVS, BED = write_inputs(tmpdir, N, args.CNVS)
+			NEW, dt = run_script(CNVS, BED)
+			print('\t'.join(['bench', str(N) + ' samples', str(len(NEW.splitlines()) - 1) + ' windows', '%.2f s' % dt.total_seconds()]))
+
+
+
+# write synthetic CNV calls and the merged windows
+def write_inputs(tmpdir, SAMPLES, CNVS):
+
+	CNV_F = os.path.join(tmpdir, 'CNVs.%d.tab' % SAMPLES)
+	BED_F = os.path.join(tmpdir, 'CNVs.%d.bed' % SAMPLES)
+	WINDOWS = {}
+	with open(CNV_F, 'w') as outfile:
+		for k in range(SAMPLES):
+			SAMPLE = 'S%04d' % k
+			for CHR in CHR_LIST:
+				# CNVs fall in hotspots 20 kb apart, so the merged windows stay separated
+				for LOCUS in sorted(random.sample(range(LOCI), CNVS)):
+					POS = LOCUS * 20000 + random.randint(0, 10) * 500 + 1
+					LENGTH = random.randint(1, 10) * 500
+					outfile.write('\t'.join([SAMPLE, CHR, str(POS), str(POS + LENGTH - 1), random.choice(['deletion', 'duplication']), str(random.uniform(0, 4))]) + '\n')
+					WINDOWS.setdefault(CHR, []).append([POS, POS + LENGTH - 1])
+
+	# merged windows, as bedtools merge
+	with open(BED_F, 'w') as outfile:
+		for CHR in CHR_LIST:
+			MERGED = []
+			for START, STOP in sorted(WINDOWS[CHR]):
+				if MERGED and START <= MERGED[-1][1]:
+					MERGED[-1][1] = max(MERGED[-1][1], STOP)
+				else:
+					MERGED.append([START, STOP])
+			for START, STOP in MERGED:
+				outfile.write('\t'.join([CHR, str(START), str(STOP)]) + '\n')
+
+	return(CNV_F, BED_F)
+
+
+
+# run Vikings.overlapCNVs.py and return its output and running time
+def run_script(CNVS, BED):
+
+	t0 = datetime.now()
+	OUT = subprocess.run([sys.executable, SCRIPT, '--allCNVs', CNVS, '--bed', BED],
+		stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, check = True, universal_newlines = True).stdout
+	dt = datetime.now() - t0
+
+	return(OUT, dt)
+
+
+
+# the original window x sample x sample x CNV loop of Vikings.overlapCNVs.py
+def legacy_overlap(CNVS, BED):
+
+	SAMPLES_DB = {}
+	SAMPLES_LIST = []
+	for line in open(CNVS):
+		SAMPLE, CHR, START, STOP, KIND, FOLD = line.rstrip('\n').split('\t')
+		if SAMPLE not in SAMPLES_DB:
+			SAMPLES_DB[SAMPLE] = []
+			SAMPLES_LIST.append(SAMPLE)
+		SAMPLES_DB[SAMPLE].append([CHR, START, STOP, KIND, FOLD])
+	WIND_DB = {}
+	for line in open(BED):
+		CHR, START, STOP = line.rstrip('\n').split('\t')
+		WIND_DB.setdefault(CHR, []).append([START, STOP])
+
+	OUT = ['\t'.join(['', '', '', '\t'.join(SAMPLES_LIST)]) + '\n']
+	for CHR in CHR_LIST:
+		for POS in WIND_DB[CHR]:
+			ROW = [CHR, POS[0], POS[1]]
+			for SAMPLE in SAMPLES_LIST:
+				CELL = []
+				for ENTRY in SAMPLES_DB:
+					if ENTRY == SAMPLE:
+						for LINE in SAMPLES_DB[ENTRY]:
+							if LINE[0] == CHR and int(LINE[1]) >= int(POS[0]) and int(LINE[2]) <= int(POS[1]):
+								CELL.append(LINE[4])
+				ROW.append(str(round(statistics.mean([float(x) for x in CELL]), 3)) if CELL else '')
+			OUT.append('\t'.join(ROW) + '\n')
+
+	return(''.join(OUT))
+
+
+
+#==================================================================#
+#   RUN                                                            #
+#==================================================================#
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3.5
+
+'''
+___________________________________________________
+
+I benchmark the DIAMOND table reader of vikingslib.diamond on a synthetic outfmt 6 table.
+I check that the columns read are identical to the line by line split of the scripts,
+then I give the throughput in lines/sec of each consumer, the line by line split against the reader:
+Vikings.tax.topath.py (qseqid, sseqid, staxids: the line split is faster, the script keeps it)
+and Vikings.check_eukbact_contigs.1.py (first column and the rest: the script uses the reader),
+then of numeric columns and, if installed, of pandas.read_csv.
+___________________________________________________
+'''
+
+
+
+#==================================================================#
+#   LOAD LIBRARIES                                                 #
+#==================================================================#
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from vikingslib import diamond
+
+
+
+#==================================================================#
+#   INPUT PARSER                                                   #
+#==================================================================#
+
+parser = argparse.ArgumentParser(description='''I benchmark the DIAMOND table reader of vikingslib.diamond.
+
+	usage:
+	python3.5 vikingslib.diamond.bench.py --lines 2000000''')
+
+parser.add_argument("--lines",
+	metavar ='LINES',
+	action = 'store',
+	type = int,
+	dest = 'LINES',
+	help = 'Number of DIAMOND hits (default: 2000000).',
+	default = 2000000)
+
+parser.add_argument("--seed",
+	metavar ='SEED',
+	action = 'store',
+	type = int,
+	dest = 'SEED',
+	help = 'Random seed (default: 42).',
+	default = 42)
+
+args = parser.parse_args()
+
+
+
+#==================================================================#
+#   FUNCTIONS                                                      #
+#==================================================================#
+
+# write the table, check the columns and time the readers
+def main():
+
+	random.seed(args.SEED)
+	with tempfile.TemporaryDirectory() as tmpdir:
+
+		TABLE = write_table(os.path.join(tmpdir, 'hits.diamond'), args.LINES)
+
+		# Vikings.tax.topath.py
+		t0 = datetime.now()
+		OLD = split_lines(TABLE)
+		report('tax.topath: line split, 13 columns (used)', datetime.now() - t0)
+
+		t0 = datetime.now()
+		NEW = [[], [], []]
+		for block in diamond.read_table(TABLE, ["qseqid", "sseqid", "staxids"]):
+			NEW[0].extend(block["qseqid"])
+			NEW[1].extend(block["sseqid"])
+			NEW[2].extend(block["staxids"])
+		report('tax.topath: read_table, 3 text columns', datetime.now() - t0)
+		if NEW != OLD:
+			sys.stderr.write("# ERROR: read_table columns differ from the line split\n")
+			sys.exit(1)
+		OLD = NEW = None
+
+		# Vikings.check_eukbact_contigs.1.py
+		t0 = datetime.now()
+		OLD = split_rest(TABLE)
+		report('check_eukbact: line split, gene and rest', datetime.now() - t0)
+
+		t0 = datetime.now()
+		NEW = [[], []]
+		for block in diamond.read_table(TABLE, [0], rest = True):
+			NEW[0].extend(block[0])
+			NEW[1].extend(block["rest"])
+		report('check_eukbact: read_table, gene and rest (used)', datetime.now() - t0)
+		if NEW != OLD:
+			sys.stderr.write("# ERROR: read_table rest differs from the line split\n")
+			sys.exit(1)
+		OLD = NEW = None
+
+		t0 = datetime.now()
+		for block in diamond.read_table(TABLE, ["qseqid", "evalue", "bitscore"]):
+			pass
+		report('read_table, text + 2 numeric columns', datetime.now() - t0)
+
+		try:
+			import pandas
+		except ImportError:
+			sys.stderr.write("# pandas not installed, skipped\n")
+			return
+		t0 = datetime.now()
+		for chunk in pandas.read_csv(TABLE, sep = '\t', header = None, names = diamond.OUTFMT6, usecols = ["qseqid", "sseqid", "staxids"],
+			dtype = str, keep_default_na = False, chunksize = 1000000):
+			pass
+		report('pandas.read_csv, 3 text columns', datetime.now() - t0)
+
+
+
+# write a synthetic DIAMOND outfmt 6 table with the staxids column
+def write_table(outname, LINES):
+
+	with open(outname, 'w') as outfile:
+		for k in range(LINES):
+			TAXIDS = ';'.join([str(random.randint(2, 2000000)) for x in range(random.choice([0, 1, 1, 1, 2, 3]))])
+			outfile.write('\t'.join(['prot%07d' % (k // 5), 'WP_%09d.1' % random.randint(0, 999999999), '%.1f' % random.uniform(30, 100),
+				str(random.randint(50, 900)), str(random.randint(0, 50)), str(random.randint(0, 5)), '1', '300', '1', '300',
+				'%.2e' % random.uniform(1e-100, 1e-5), '%.1f' % random.uniform(40, 900), TAXIDS]) + '\n')
+
+	return(outname)
+
+
+
+# the line by line unpacking of the 13 columns of the scripts
+def split_lines(TABLE):
+
+	COLUMNS = [[], [], []]
+	with open(TABLE) as infile:
+		for line in infile:
+			line = line.rstrip('\n')
+			prot, AC, pident, length, mismatch, gapopen, qstart, qend, sstart, send, evalue, bitscore, staxids = line.split('\t')
+			COLUMNS[0].append(prot)
+			COLUMNS[1].append(AC)
+			COLUMNS[2].append(staxids)
+
+	return(COLUMNS)
+
+
+
+# the line by line split of the first column and the rest of Vikings.check_eukbact_contigs.1.py
+def split_rest(TABLE):
+
+	COLUMNS = [[], []]
+	with open(TABLE) as infile:
+		for line in infile:
+			GENE, *TAX = line.rstrip('\n').split('\t')
+			COLUMNS[0].append(GENE)
+			COLUMNS[1].append('\t'.join(TAX))
+
+	return(COLUMNS)
+
+
+
+# print the throughput of a reader
+def report(name, dt):
+
+	print('\t'.join([name, '%.2f s' % dt.total_seconds(), '%d lines/sec' % (args.LINES / max(dt.total_seconds(), 1e-6))]))
+
+
+
+#==================================================================#
+#   RUN                                                            #
+#==================================================================#
+
+if __name__ == '__main__':
+	main()
@@ -15,16 +15,15 @@ Andrea Del Cortona
 
 import argparse
 import functools
-import numpy
+#import numpy
 import os
-import pandas
+#import pandas
 import re
 import shutil
 import string
 import sys
 import csv
-from ete3 import NCBITaxa
-ncbi = NCBITaxa()
+from vikingslib import taxonomy
 
 
 ####################################################################
@@ -34,27 +33,51 @@ ncbi = NCBITaxa()
 parser = argparse.ArgumentParser(description='''I assign full taxomonic path to a the DIAMOND output
 
 	usage:
-	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab >> OUTPUT.tab''')
+	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab >> OUTPUT.tab
+
+	With --taxdb, the lineages are read from a flat taxonomy index (numpy arrays + string table, memory-mapped)
+	and ete3 is not loaded: a taxid missing from the index is "taxid not available".
+	--build_taxdb compiles it once from the NCBI taxdump (nodes.dmp, names.dmp, merged.dmp) or from the ete3 taxa.sqlite.
+
+	usage:
+	~/anaconda_ete/bin/python3.6 tax.topath.py --build_taxdb taxdump/ --taxdb taxdb/
+	~/anaconda_ete/bin/python3.6 tax.topath.py --input DIAMOND.output.tab --taxdb taxdb/ >> OUTPUT.tab''')
 
 parser.add_argument("--input",
 	metavar='INPUT',
 	action = 'store',
 	type = str,
 	dest = 'INPUT',
-	help = 'the DIAMOND.output.tab input file in format 6, with taxid as last (13th) column',
-	required = True)
+	help = 'the DIAMOND.output.tab input file in format 6, with taxid as last (13th) column')
+
+parser.add_argument("--taxdb",
+	metavar='TAXDB',
+	action = 'store',
+	type = str,
+	dest = 'TAXDB',
+	help = 'directory of the flat taxonomy index built by --build_taxdb, lineages are resolved without ete3')
+
+parser.add_argument("--build_taxdb",
+	metavar='TAXDUMP',
+	action = 'store',
+	type = str,
+	dest = 'BUILD_TAXDB',
+	help = 'compile the NCBI taxdump directory (nodes.dmp, names.dmp, merged.dmp) or the ete3 taxa.sqlite into --taxdb')
 
 args = parser.parse_args()
 
+if args.INPUT is None and args.BUILD_TAXDB is None:
+	parser.error('the following arguments are required: --input')
+if args.BUILD_TAXDB is not None and args.TAXDB is None:
+	parser.error('--build_taxdb requires --taxdb')
+
 
 ####################################################################
 ### FUNCTIONS ######################################################
 ####################################################################
 
 def get_desired_ranks(taxid):
-	lineage = ncbi.get_lineage(taxid)
-	names = ncbi.get_taxid_translator(lineage)
-	return [names[taxid] for taxid in lineage]
+	return taxonomy.get_lineage_names(resolver, taxid)
 
 def main(taxids):
 	mytax = get_desired_ranks(taxids)
@@ -65,6 +88,15 @@ def main(taxids):
 ### RUN ############################################################
 ####################################################################
 
+if args.BUILD_TAXDB is not None:
+	n = taxonomy.build_flat_index(args.BUILD_TAXDB, args.TAXDB)
+	sys.stderr.write("# %d taxids written to %s\n" % (n, args.TAXDB))
+	if args.INPUT is None:
+		sys.exit(0)
+
+# ete3 is only loaded if --taxdb is not given, a taxid missing from --taxdb is not available
+resolver = taxonomy.new_resolver(index_dir = args.TAXDB)
+
 with open(args.INPUT, 'r') as input_file:
 
 	for line in input_file:
@@ -78,6 +110,8 @@ with open(args.INPUT, 'r') as input_file:
 			# generates the lineage
 			taxids = main_taxid
 			mytax = main(taxids)		
+			if mytax is None:
+				mytax = ["taxid not available"]
 		
 			# print output
 			mytax.insert(0, AC)
@@ -90,3 +124,5 @@ with open(args.INPUT, 'r') as input_file:
 			mytax.insert(0, AC)
 			mytax.insert(0, prot)		
 			print(*mytax, sep = '\t')
+
+taxonomy.close_resolver(resolver)
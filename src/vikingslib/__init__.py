@@ -0,0 +1,3 @@
+'''
+Shared readers and indexes used by the Vikings scripts.
+'''
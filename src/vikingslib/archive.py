@@ -0,0 +1,144 @@
+'''
+I pack many small text files (cluster gene lists, cluster fasta) in one archive: a data file with the
+files one after the other, and a tab separated index (archive + ".idx": name, offset, length in bytes).
+Any file is read by offset from the memory-mapped data file, without scanning the archive.
+The same functions read and write plain directories, so that the scripts take either.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+import mmap
+import os
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+def is_archive(path):
+	'''
+	I tell if path is a packed archive (a file with its .idx index) rather than a directory.
+	'''
+
+	return(os.path.isfile(path) and os.path.isfile(path + '.idx'))
+
+
+
+def read_index(path):
+	'''
+	I read the index of an archive into the list of names, in packing order,
+	and a dictionary name -> (offset, length).
+	'''
+
+	names = []
+	index = {}
+	with open(path + '.idx') as infile:
+		for line in infile:
+			name, offset, length = line.rstrip('\n').split('\t')
+			if name not in index:
+				names.append(name)
+			index[name] = (int(offset), int(length))
+
+	return(names, index)
+
+
+
+def open_input(path):
+	'''
+	I return a store of the files of an archive (memory-mapped) or of a directory:
+	{"path", "names", "index", "mmap"}, "index" is None for a directory.
+	'''
+
+	if not is_archive(path):
+		return({"path": path, "names": os.listdir(path), "index": None, "mmap": None})
+
+	names, index = read_index(path)
+	store = {"path": path, "names": names, "index": index, "mmap": None}
+	if os.path.getsize(path) > 0:
+		with open(path, 'rb') as infile:
+			store["mmap"] = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+
+	return(store)
+
+
+
+def read(store, name):
+	'''
+	I return the text of the file name of a store.
+	'''
+
+	if store["index"] is None:
+		with open('%s/%s' % (store["path"], name)) as infile:
+			return(infile.read())
+
+	offset, length = store["index"][name]
+	if length == 0:
+		return('')
+
+	return(store["mmap"][offset:offset + length].decode())
+
+
+
+def read_lines(store, name):
+	'''
+	I return the lines of the file name of a store, without the end of line.
+	'''
+
+	lines = read(store, name).split('\n')
+	if lines[-1] == '':
+		lines.pop()
+
+	return(lines)
+
+
+
+def open_output(path, packed = False):
+	'''
+	I return an output store: an archive written at path if packed, otherwise the directory path.
+	'''
+
+	if not packed:
+		return({"path": path, "data": None, "entries": None, "offset": 0})
+
+	# an old index must not describe the new data
+	if os.path.exists(path + '.idx'):
+		os.remove(path + '.idx')
+
+	return({"path": path, "data": open(path, 'wb'), "entries": [], "offset": 0})
+
+
+
+def write(store, name, text):
+	'''
+	I write text as the file name of an output store.
+	'''
+
+	if store["data"] is None:
+		with open('%s/%s' % (store["path"], name), 'w') as oF:
+			oF.write(text)
+		return
+
+	if '\t' in name or '\n' in name:
+		raise ValueError("%s: tab or new line in the name %r" % (store["path"], name))
+	data = text.encode()
+	store["data"].write(data)
+	store["entries"].append('%s\t%d\t%d\n' % (name, store["offset"], len(data)))
+	store["offset"] += len(data)
+
+
+
+def close_output(store):
+	'''
+	I close an output store, the index of an archive is written last so that it never lists missing data.
+	'''
+
+	if store["data"] is None:
+		return
+
+	store["data"].close()
+	with open(store["path"] + '.idx.%d.tmp' % os.getpid(), 'w') as oF:
+		oF.write(''.join(store["entries"]))
+	os.replace(store["path"] + '.idx.%d.tmp' % os.getpid(), store["path"] + '.idx')
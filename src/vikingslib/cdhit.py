@@ -0,0 +1,82 @@
+'''
+I read CD-HIT .clstr files one cluster at a time, the whole clustering is never held in memory.
+Each cluster has its member names and their lengths and % identities as numeric arrays,
+the representative first.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+import numpy
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+def parse_member(line):
+	'''
+	I parse a member line of a .clstr ("3	91aa, >name... at 93.41%", "0	1341nt, >name... *", "1	900nt, >name... at +/98.51%").
+	I return its name, length, % identity (None for the representative).
+	'''
+
+	Num, Info = line.split('\t')
+	LenRaw, NameRaw, *pidRaw = Info.split(' ')
+	Len = int(LenRaw.replace(',', '').replace('aa', '').replace('nt', ''))
+	Name = NameRaw.replace('>', '').replace('...', '')
+	if pidRaw == ["*"]:
+		return(Name, Len, None)
+
+	# cd-hit-est gives the strand before the identity
+	pid = float(pidRaw[1].replace('%', '').split('/')[-1])
+
+	return(Name, Len, pid)
+
+
+
+def make_cluster(name, representative, members):
+	'''
+	I return a cluster: {"name", "names", "length" (int64), "pid" (float64)}, the representative first at 100% identity.
+	'''
+
+	if representative is None:
+		raise ValueError("the cluster %s has no representative sequence" % name)
+	members = [(representative[0], representative[1], 100.0)] + members
+
+	return({
+		"name": name,
+		"names": [member[0] for member in members],
+		"length": numpy.array([member[1] for member in members], dtype = numpy.int64),
+		"pid": numpy.array([member[2] for member in members], dtype = numpy.float64)
+	})
+
+
+
+def read_clusters(clstr):
+	'''
+	I yield the clusters of a .clstr file (see make_cluster), in file order.
+	'''
+
+	name = None
+	with open(clstr) as infile:
+		for line in infile:
+			line = line.rstrip('\n')
+			if line == '':
+				continue
+			# is it a new cluster?
+			if line[0] == '>':
+				if name is not None:
+					yield(make_cluster(name, representative, members))
+				name = line[1:]
+				representative = None
+				members = []
+			else:
+				member = parse_member(line)
+				if member[2] is None:
+					representative = member
+				else:
+					members.append(member)
+		if name is not None:
+			yield(make_cluster(name, representative, members))
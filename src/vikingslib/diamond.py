@@ -0,0 +1,86 @@
+'''
+I read DIAMOND tabular (outfmt 6) tables, and the other tab separated tables derived from them.
+Tables are read in blocks of whole lines and only the requested columns are kept:
+numeric columns as numpy arrays, text columns as lists of str.
+Large tables are split in byte ranges aligned to the lines (tabix.byte_ranges), so they can be processed in parallel.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+import numpy
+from vikingslib import tabix
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+# DIAMOND --outfmt 6 qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore staxids
+OUTFMT6 = ["qseqid", "sseqid", "pident", "length", "mismatch", "gapopen", "qstart", "qend", "sstart", "send", "evalue", "bitscore", "staxids"]
+DTYPES = {
+	"pident": numpy.float64,
+	"length": numpy.int64,
+	"mismatch": numpy.int64,
+	"gapopen": numpy.int64,
+	"qstart": numpy.int64,
+	"qend": numpy.int64,
+	"sstart": numpy.int64,
+	"send": numpy.int64,
+	"evalue": numpy.float64,
+	"bitscore": numpy.float64
+}
+
+
+
+
+def read_table(path, columns, names = OUTFMT6, start = 0, stop = None, rest = False):
+	'''
+	I yield the blocks of a tab separated table as dictionaries column -> values.
+	Columns are given by name (in names) or by 0-based index; the columns in DTYPES are numpy arrays,
+	the others lists of str. With rest, "rest" holds what follows the last requested column (None if nothing).
+	'''
+
+	indexes = [column if isinstance(column, int) else names.index(column) for column in columns]
+	# small blocks: the lists of a block are freed before the garbage collector has to walk them
+	for block in tabix.read_blocks(path, start, stop, block_size = 1 << 18):
+		text = block.decode()
+		if '\r' in text:
+			text = text.replace('\r\n', '\n')
+		lines = text.split('\n')
+		lines.pop()
+		yield(split_columns(path, lines, columns, indexes, rest))
+
+
+
+def split_columns(path, lines, columns, indexes, rest):
+	'''
+	I keep the requested columns of a block line by line, splitting only up to the last requested column.
+	'''
+
+	last = max(indexes)
+	values = [[] for column in columns]
+	appends = list(zip([column_values.append for column_values in values], indexes))
+	remainders = []
+	try:
+		for line in lines:
+			fields = line.split('\t', last + 1)
+			for append, k in appends:
+				append(fields[k])
+			if rest:
+				remainders.append(fields[last + 1] if len(fields) > last + 1 else None)
+	except IndexError:
+		raise ValueError("%s: a line has less than %d columns" % (path, last + 1))
+
+	block = {}
+	for column, column_values in zip(columns, values):
+		if column in DTYPES:
+			block[column] = numpy.array(column_values, dtype = DTYPES[column])
+		else:
+			block[column] = column_values
+	if rest:
+		block["rest"] = remainders
+
+	return(block)
@@ -0,0 +1,159 @@
+'''
+I index fasta files with a samtools faidx compatible .fai (name, length, offset, line bases, line width)
+and I fetch sequences by byte offset from the memory-mapped fasta, without loading it.
+Fasta files that cannot be indexed (lines of different lengths in a sequence, or no write access
+to their directory) are read in memory instead.
+As with samtools faidx, a sequence is named by its header up to the first white space, also when read in memory.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+import mmap
+import os
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+def build_fai(fasta, fai = None):
+	'''
+	I write the .fai index of a fasta (default: fasta + ".fai") in one pass.
+	As samtools faidx, the name is the header up to the first white space,
+	and all the lines of a sequence but the last must have the same length.
+	'''
+
+	if fai is None:
+		fai = fasta + '.fai'
+
+	entries = []
+	with open(fasta, 'rb') as infile:
+		offset = 0
+		entry = None
+		last_line = False
+		for line in infile:
+			if line[:1] == b'>':
+				if entry is not None:
+					entries.append(entry)
+				fields = line[1:].split(None, 1)
+				name = fields[0].decode() if fields else ''
+				entry = [name, 0, offset + len(line), 0, 0]
+				last_line = False
+			elif entry is not None:
+				bases = len(line.rstrip(b'\r\n'))
+				# a shorter line must be the last one of the sequence
+				if last_line and bases > 0:
+					raise ValueError("%s: different line length in sequence %s" % (fasta, entry[0]))
+				if entry[3] == 0:
+					entry[3] = bases
+					entry[4] = len(line)
+				elif bases != entry[3] or len(line) != entry[4]:
+					last_line = True
+					if bases > entry[3]:
+						raise ValueError("%s: different line length in sequence %s" % (fasta, entry[0]))
+				entry[1] += bases
+			offset += len(line)
+		if entry is not None:
+			entries.append(entry)
+
+	with open(fai, 'w') as outfile:
+		for entry in entries:
+			outfile.write('\t'.join([str(x) for x in entry]) + '\n')
+
+	return(fai)
+
+
+
+def read_fai(fai):
+	'''
+	I read a .fai index into a dictionary name -> (length, offset, line bases, line width).
+	'''
+
+	index = {}
+	with open(fai) as infile:
+		for line in infile:
+			fields = line.rstrip('\n').split('\t')
+			index[fields[0]] = tuple(int(x) for x in fields[1:5])
+
+	return(index)
+
+
+
+def read_sequences(fasta):
+	'''
+	I read all the sequences of a fasta in a dictionary name -> sequence,
+	named as in the .fai index (the header up to the first white space).
+	'''
+
+	lines = {}
+	with open(fasta) as infile:
+		name = None
+		for line in infile:
+			line = line.rstrip('\n')
+			if line[:1] == '>':
+				fields = line[1:].split(None, 1)
+				name = fields[0] if fields else ''
+				lines[name] = []
+			elif name is not None:
+				lines[name].append(line)
+
+	return(dict((name, ''.join(lines[name])) for name in lines))
+
+
+
+def memory_store(fasta, error):
+	'''
+	I return a fasta store that holds the sequences of a fasta that is not indexed, and why.
+	'''
+
+	sequences = read_sequences(fasta)
+
+	return({"index": dict.fromkeys(sequences), "mmap": None, "sequences": sequences, "error": error})
+
+
+
+def open_fasta(fasta):
+	'''
+	I return a fasta store: the .fai index (built, or rebuilt if older than the fasta) and the memory-mapped fasta.
+	If the fasta cannot be indexed, or its index cannot be written, the store holds its sequences.
+	'''
+
+	fai = fasta + '.fai'
+	if not os.path.exists(fai) or os.path.getmtime(fai) < os.path.getmtime(fasta):
+		try:
+			build_fai(fasta, fai)
+		except ValueError as error:
+			return(memory_store(fasta, str(error)))
+		except OSError as error:
+			# e.g. a read-only directory: the fasta is read, but the index cannot be written next to it
+			return(memory_store(fasta, "%s: cannot write the index (%s)" % (fasta, error)))
+
+	store = {"index": read_fai(fai), "mmap": None, "sequences": None, "error": None}
+	if os.path.getsize(fasta) > 0:
+		with open(fasta, 'rb') as infile:
+			store["mmap"] = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+
+	return(store)
+
+
+
+def fetch(store, name):
+	'''
+	I return the sequence of name, reading only its bytes from the memory-mapped fasta.
+	'''
+
+	if store["sequences"] is not None:
+		return(store["sequences"][name])
+
+	length, offset, line_bases, line_width = store["index"][name]
+	if length == 0:
+		return('')
+
+	# the sequence spans its bases plus the end of line bytes of its full lines
+	lines = (length - 1) // line_bases
+	data = store["mmap"][offset:offset + length + lines * (line_width - line_bases)]
+
+	return(data.replace(b'\n', b'').replace(b'\r', b'').decode())
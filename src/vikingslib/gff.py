@@ -0,0 +1,109 @@
+'''
+I index the MAKER CDS gff of a genome: contig -> ordered genes, with their positions and strands.
+The index is parsed once and pickled next to the gff, it is rebuilt when the size or the mtime of the gff change.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+import os
+import pickle
+import re
+import numpy
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+# bump when the layout of the pickled index changes
+INDEX_VERSION = 1
+ID_TAG = re.compile(r"ID=")
+CDS_TAIL = re.compile(r"\:cds\;.*")
+
+
+
+def gene_id(attributes):
+	'''
+	I return the gene ID of the 9th column of a MAKER CDS line, as check_eukbact_contigs.1.py does:
+	the attributes without "ID=", cut at ":cds;" and at the first "|".
+	'''
+
+	gene = ID_TAG.sub("", attributes)
+	gene = CDS_TAIL.sub("", gene)
+
+	return(gene.split("|", 1)[0])
+
+
+
+def parse_gff(gff):
+	'''
+	I parse a gff into a dictionary contig -> {"genes": [IDs], "start": array, "end": array, "strand": str},
+	contigs in order of first appearance and genes in file order.
+	'''
+
+	rows = {}
+	with open(gff) as infile:
+		for line in infile:
+			line = line.rstrip('\n')
+			if line == '' or line[0] == '#':
+				continue
+			contig, source, feature, start, end, score, strand, phase, attributes = line.split('\t')
+			rows.setdefault(contig, []).append((gene_id(attributes), int(start), int(end), strand))
+
+	contigs = {}
+	for contig in rows:
+		contigs[contig] = {
+			"genes": [row[0] for row in rows[contig]],
+			"start": numpy.array([row[1] for row in rows[contig]], dtype = numpy.int64),
+			"end": numpy.array([row[2] for row in rows[contig]], dtype = numpy.int64),
+			"strand": ''.join([row[3] for row in rows[contig]])
+		}
+
+	return(contigs)
+
+
+
+def file_stamp(path):
+	'''
+	I return the size and the mtime (ns) of a file, they invalidate its index.
+	'''
+
+	stat = os.stat(path)
+
+	return((stat.st_size, stat.st_mtime_ns))
+
+
+
+def load_gff(gff, index_path = None):
+	'''
+	I return the contig index of a gff (see parse_gff), from its pickled index (default: gff + ".idx.pkl")
+	if it is up to date, otherwise I parse the gff and write the index.
+	'''
+
+	if index_path is None:
+		index_path = gff + '.idx.pkl'
+	stamp = file_stamp(gff)
+
+	if os.path.exists(index_path):
+		try:
+			with open(index_path, 'rb') as infile:
+				index = pickle.load(infile)
+			if index["version"] == INDEX_VERSION and index["stamp"] == stamp:
+				return(index["contigs"])
+		except (pickle.UnpicklingError, EOFError, KeyError, TypeError):
+			pass
+
+	contigs = parse_gff(gff)
+	index = {"version": INDEX_VERSION, "stamp": stamp, "contigs": contigs}
+	# write and rename, so that parallel runs never read a half written index
+	try:
+		with open(index_path + '.%d.tmp' % os.getpid(), 'wb') as outfile:
+			pickle.dump(index, outfile, protocol = pickle.HIGHEST_PROTOCOL)
+		os.replace(index_path + '.%d.tmp' % os.getpid(), index_path)
+	except OSError:
+		pass
+
+	return(contigs)
@@ -0,0 +1,57 @@
+'''
+I hold the helpers of the HGT scripts (check_eukbact_contigs, Bactmatch):
+a streaming window over the genes of a contig, to test the taxonomy of their neighbours.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+from collections import deque
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+# taxonomy column of the eukaryotic hits in the HGT tables
+EUKARYOTA = "['Eukaryota']"
+
+
+
+def flank_windows(records, flank):
+	'''
+	I yield (record, neighbours) for each record of a stream grouped by contig (record[0]).
+	The neighbours are the records up to flank positions before and after, on the same contig.
+	I keep at most 2 * flank + 1 records in memory.
+	'''
+
+	window = deque()
+	center = 0
+	for record in records:
+		# a new contig: the remaining records of the previous one have no more neighbours after them
+		if window and record[0] != window[-1][0]:
+			for k in range(center, len(window)):
+				yield(window[k], neighbours(window, k, flank))
+			window.clear()
+			center = 0
+		window.append(record)
+		if len(window) - 1 - center >= flank:
+			yield(window[center], neighbours(window, center, flank))
+			center += 1
+			if center > flank:
+				window.popleft()
+				center -= 1
+
+	for k in range(center, len(window)):
+		yield(window[k], neighbours(window, k, flank))
+
+
+
+def neighbours(window, k, flank):
+	'''
+	I return the records of the window up to flank positions before and after the k-th one.
+	'''
+
+	return([window[j] for j in range(max(0, k - flank), min(len(window), k + flank + 1)) if j != k])
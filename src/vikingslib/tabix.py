@@ -0,0 +1,383 @@
+'''
+I read bgzip compressed files and their tabix (.tbi) or CSI (.csi) index.
+I fetch the lines overlapping a region by seeking straight to the BGZF blocks listed in the index.
+Pure python, no htslib needed.
+I also open plain, gzip or bgzip text files, and read plain text files by byte ranges aligned to the lines.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+import gzip
+import os
+import struct
+import zlib
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+# VCF preset: sequence column, begin column, end column (0 = from REF length), 1-based
+VCF_PRESET = (1, 2, 0, True)
+
+
+
+def is_gzip(path):
+	'''
+	I tell if a file is gzip (or bgzip) compressed, from its magic number.
+	'''
+
+	with open(path, 'rb') as infile:
+		return(infile.read(2) == b'\x1f\x8b')
+
+
+
+def open_text(path):
+	'''
+	I open a plain, gzip or bgzip compressed file as text.
+	'''
+
+	if is_gzip(path):
+		return(gzip.open(path, 'rt'))
+
+	return(open(path))
+
+
+
+def byte_ranges(path, chunk_size):
+	'''
+	I split a file in byte ranges of about chunk_size bytes.
+	An empty file gets one empty range.
+	'''
+
+	size = os.path.getsize(path)
+	if size == 0:
+		return([(0, 0)])
+
+	return([(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)])
+
+
+
+def read_blocks(path, start = 0, stop = None, block_size = 1 << 22):
+	'''
+	I yield blocks (bytes) of the whole lines of a text file starting between the byte offsets start and stop,
+	reading about block_size bytes at a time. Every line of a block ends with a newline.
+	'''
+
+	if stop is None:
+		stop = os.path.getsize(path)
+
+	with open(path, 'rb') as infile:
+		# a line cut by start belongs to the previous range
+		if start > 0:
+			infile.seek(start - 1)
+			infile.readline()
+		offset = infile.tell()
+		buffer = b''
+		while offset < stop:
+			data = infile.read(block_size)
+			if data == b'':
+				# last line without newline
+				if buffer != b'':
+					yield(buffer + b'\n')
+				break
+			data = buffer + data
+			cut = data.rfind(b'\n') + 1
+			if cut == 0:
+				buffer = data
+				continue
+			# keep only the lines starting before stop
+			if offset + cut > stop:
+				yield(data[:data.find(b'\n', stop - offset - 1) + 1])
+				break
+			yield(data[:cut])
+			buffer = data[cut:]
+			offset += cut
+
+
+
+def read_range(path, start, stop):
+	'''
+	I yield the lines (without newline, as fetch) of a plain text file starting between the byte offsets start and stop.
+	'''
+
+	for block in read_blocks(path, start, stop):
+		lines = block.decode().split('\n')
+		lines.pop()
+		for line in lines:
+			yield(line)
+
+
+
+def parse_region(region):
+	'''
+	I parse a chr, chr:start or chr:start-end region (1-based, inclusive).
+	I return the chromosome and the 0-based, half-open begin and end.
+	'''
+
+	region = region.replace(',', '')
+	if ':' not in region:
+		return(region, 0, 1 << 62)
+
+	chrom, coords = region.rsplit(':', 1)
+	if '-' in coords:
+		start, stop = coords.split('-')
+		stop = int(stop) if stop != '' else 1 << 62
+	else:
+		start, stop = coords, 1 << 62
+	beg = max(0, int(start) - 1)
+
+	return(chrom, beg, stop)
+
+
+
+def find_index(path):
+	'''
+	I return the path of the .tbi or .csi index of a bgzip file, or None.
+	'''
+
+	for suffix in ('.tbi', '.csi'):
+		if os.path.exists(path + suffix):
+			return(path + suffix)
+
+	return(None)
+
+
+
+def read_index(index_path):
+	'''
+	I read a tabix (.tbi) or CSI (.csi) index.
+	I return a dictionary with the column preset, the sequence names and, for each sequence,
+	the bins (bin -> list of chunks as virtual offsets) and the linear index (tbi only).
+	'''
+
+	with gzip.open(index_path, 'rb') as infile:
+		data = infile.read()
+
+	magic = data[:4]
+	if magic == b'TBI\x01':
+		n_ref, = struct.unpack_from('<i', data, 4)
+		min_shift, depth = 14, 5
+		header = data[8:]
+		offset = 8
+	elif magic == b'CSI\x01':
+		min_shift, depth, l_aux = struct.unpack_from('<iii', data, 4)
+		header = data[16:16 + l_aux]
+		offset = 16 + l_aux
+		n_ref, = struct.unpack_from('<i', data, offset)
+		offset += 4
+	else:
+		raise ValueError("%s is not a tabix or CSI index" % index_path)
+
+	# tabix header: format, columns, meta character, skipped lines, sequence names
+	fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack_from('<iiiiiii', header, 0)
+	names = header[28:28 + l_nm].split(b'\x00')[:-1]
+	if magic == b'TBI\x01':
+		offset += 28 + l_nm
+
+	refs = []
+	for k in range(n_ref):
+		bins = {}
+		n_bin, = struct.unpack_from('<i', data, offset)
+		offset += 4
+		for j in range(n_bin):
+			if magic == b'TBI\x01':
+				bin_id, n_chunk = struct.unpack_from('<Ii', data, offset)
+				offset += 8
+			else:
+				bin_id, loffset, n_chunk = struct.unpack_from('<IQi', data, offset)
+				offset += 16
+			chunks = struct.unpack_from('<%dQ' % (2 * n_chunk), data, offset)
+			offset += 16 * n_chunk
+			bins[bin_id] = [(chunks[i], chunks[i + 1]) for i in range(0, len(chunks), 2)]
+		linear = []
+		if magic == b'TBI\x01':
+			n_intv, = struct.unpack_from('<i', data, offset)
+			offset += 4
+			linear = struct.unpack_from('<%dQ' % n_intv, data, offset)
+			offset += 8 * n_intv
+		refs.append([bins, linear])
+
+	index = {
+		"preset": (col_seq, col_beg, col_end, (fmt & 0xffff) == 2),
+		"meta": chr(meta),
+		"min_shift": min_shift,
+		"depth": depth,
+		"names": dict((names[k].decode(), k) for k in range(len(names))),
+		"refs": refs
+	}
+
+	return(index)
+
+
+
+def reg2bins(beg, end, min_shift, depth):
+	'''
+	I return the list of bins overlapping the 0-based, half-open interval beg-end.
+	'''
+
+	bins = []
+	if beg >= end:
+		return(bins)
+	end -= 1
+	t = 0
+	s = min_shift + depth * 3
+	for level in range(depth + 1):
+		bins.extend(range(t + (beg >> s), t + (min(end, (1 << (min_shift + depth * 3)) - 1) >> s) + 1))
+		s -= 3
+		t += 1 << (level * 3)
+
+	return(bins)
+
+
+
+def query_chunks(index, chrom, beg, end):
+	'''
+	I return the sorted, merged list of chunks (virtual offsets) that can hold records in chrom:beg-end.
+	'''
+
+	if chrom not in index["names"]:
+		return([])
+	bins, linear = index["refs"][index["names"][chrom]]
+
+	# records before the linear index offset cannot overlap the region
+	min_off = 0
+	if len(linear) > 0:
+		min_off = linear[min(beg >> index["min_shift"], len(linear) - 1)]
+
+	chunks = []
+	for bin_id in reg2bins(beg, end, index["min_shift"], index["depth"]):
+		for chunk in bins.get(bin_id, []):
+			if chunk[1] > min_off:
+				chunks.append(chunk)
+	chunks.sort()
+
+	merged = []
+	for chunk in chunks:
+		if merged and chunk[0] <= merged[-1][1]:
+			merged[-1][1] = max(merged[-1][1], chunk[1])
+		else:
+			merged.append([max(chunk[0], min_off), chunk[1]])
+
+	return(merged)
+
+
+
+def read_block(handle, coffset):
+	'''
+	I read and decompress the BGZF block starting at the compressed offset coffset.
+	I return the uncompressed data and the compressed size of the block.
+	'''
+
+	handle.seek(coffset)
+	header = handle.read(12)
+	if len(header) < 12:
+		return(b'', 0)
+	if header[:4] != b'\x1f\x8b\x08\x04':
+		raise ValueError("not a BGZF block at offset %d" % coffset)
+	xlen, = struct.unpack('<H', header[10:12])
+	extra = handle.read(xlen)
+
+	# BC subfield holds the total block size - 1
+	bsize = None
+	i = 0
+	while i < xlen:
+		si1, si2, slen = extra[i], extra[i + 1], struct.unpack('<H', extra[i + 2:i + 4])[0]
+		if si1 == 66 and si2 == 67:
+			bsize, = struct.unpack('<H', extra[i + 4:i + 6])
+		i += 4 + slen
+	if bsize is None:
+		raise ValueError("BGZF block without BC subfield at offset %d" % coffset)
+
+	cdata = handle.read(bsize + 1 - 12 - xlen)
+
+	return(zlib.decompress(cdata[:-8], -15), bsize + 1)
+
+
+
+def read_chunk(handle, start, stop):
+	'''
+	I yield the lines (bytes, without newline) starting between the virtual offsets start and stop.
+	'''
+
+	coffset, uoffset = start >> 16, start & 0xffff
+	line_start = start
+	buffer = b''
+	while True:
+		data, size = read_block(handle, coffset)
+		if size == 0:
+			break
+		pos = uoffset
+		while True:
+			# a new line starting at or after stop belongs to the next chunk
+			if buffer == b'' and line_start >= stop:
+				return
+			newline = data.find(b'\n', pos)
+			if newline < 0:
+				buffer += data[pos:]
+				break
+			yield(buffer + data[pos:newline])
+			buffer = b''
+			pos = newline + 1
+			line_start = (coffset << 16) | pos
+		coffset += size
+		uoffset = 0
+		if buffer == b'':
+			line_start = coffset << 16
+	if buffer != b'':
+		yield(buffer)
+
+
+
+def line_interval(fields, preset):
+	'''
+	I return chromosome, 0-based begin and end of a tab-split line according to the column preset.
+	'''
+
+	col_seq, col_beg, col_end, is_vcf = preset
+	chrom = fields[col_seq - 1]
+	beg = int(fields[col_beg - 1]) - 1
+	if is_vcf:
+		end = beg + len(fields[3])
+	elif col_end > 0:
+		end = int(fields[col_end - 1])
+	else:
+		end = beg + 1
+
+	return(chrom, beg, end)
+
+
+
+def overlaps(line, chrom, beg, end, preset = VCF_PRESET):
+	'''
+	I tell if a text line overlaps chrom:beg-end, the same way tabix does.
+	'''
+
+	fields = line.split('\t', max(preset[:3]) + 3)
+	l_chrom, l_beg, l_end = line_interval(fields, preset)
+
+	return(l_chrom == chrom and l_beg < end and l_end > beg)
+
+
+
+def fetch(path, index, chrom, beg, end):
+	'''
+	I yield the text lines of a bgzip file overlapping chrom:beg-end (0-based, half-open),
+	reading only the BGZF blocks listed in the index.
+	'''
+
+	with open(path, 'rb') as handle:
+		for start, stop in query_chunks(index, chrom, beg, end):
+			for line in read_chunk(handle, start, stop):
+				line = line.decode()
+				if line == '' or line[0] == index["meta"]:
+					continue
+				l_chrom, l_beg, l_end = line_interval(line.split('\t', max(index["preset"][:3]) + 3), index["preset"])
+				# records are sorted: stop after the region
+				if l_chrom == chrom and l_beg >= end:
+					return
+				if l_chrom == chrom and l_beg < end and l_end > beg:
+					yield(line)
@@ -0,0 +1,445 @@
+'''
+I resolve NCBI taxids into the names of their full lineage, from the root to the taxid.
+Lineages are memoized in the process and stored in an on-disk SQLite cache keyed by taxid,
+so later runs and other samples do not query the ete3 taxonomy database again.
+I also compile the NCBI nodes/names into a flat index (numpy arrays + string table, mmap-able)
+that resolves lineages, ranks and lowest common ancestors without ete3.
+The flat index is authoritative: a taxid missing from it is not available, ete3 is never imported.
+Without it, ete3 is only imported when a taxid is missing from the cache.
+'''
+
+
+
+#------------------------------------------------------------------#
+# LOAD LIBRARIES
+
+import mmap
+import os
+import sqlite3
+import numpy
+from urllib.request import pathname2url
+
+
+
+#------------------------------------------------------------------#
+# FUNCTIONS
+
+# the ranks of the rank-filtered output
+RANKS = ["superkingdom", "phylum", "class", "order", "family", "genus", "species"]
+
+
+
+def new_resolver(cache_path = None, index_dir = None, read_only = False):
+	'''
+	I return a lineage resolver: the in-process memo, the flat index and the SQLite cache (if any)
+	and ete3 (loaded on demand).
+	A read only resolver does not write the new lineages to the cache, so that many processes can share it.
+	'''
+
+	resolver = {
+		"memo": {},
+		"index": None,
+		"cache": None,
+		"read_only": read_only,
+		"ncbi": None,
+		"pending": 0
+	}
+	if index_dir is not None:
+		resolver["index"] = load_flat_index(index_dir)
+	if cache_path is not None:
+		resolver["cache"] = open_cache(cache_path, read_only)
+
+	return(resolver)
+
+
+
+def open_cache(cache_path, read_only = False):
+	'''
+	I open (and create, if missing) the SQLite lineage cache.
+	'''
+
+	if read_only:
+		return(sqlite3.connect('file:' + pathname2url(os.path.abspath(cache_path)) + '?mode=ro', uri = True))
+
+	cache = sqlite3.connect(cache_path)
+	cache.execute('CREATE TABLE IF NOT EXISTS lineage (taxid INTEGER PRIMARY KEY, names TEXT NOT NULL)')
+
+	return(cache)
+
+
+
+def close_resolver(resolver):
+	'''
+	I write the new lineages to the SQLite cache and close it.
+	'''
+
+	if resolver["cache"] is not None:
+		if not resolver["read_only"]:
+			resolver["cache"].commit()
+		resolver["cache"].close()
+		resolver["cache"] = None
+
+
+
+def get_ncbi(resolver):
+	'''
+	I load ete3 NCBITaxa the first time it is needed.
+	'''
+
+	if resolver["ncbi"] is None:
+		from ete3 import NCBITaxa
+		resolver["ncbi"] = NCBITaxa()
+
+	return(resolver["ncbi"])
+
+
+
+def ete3_lineage_names(ncbi, taxid):
+	'''
+	I query ete3 for the lineage of a taxid, I return the list of names from the root.
+	'''
+
+	lineage = ncbi.get_lineage(taxid)
+	names = ncbi.get_taxid_translator(lineage)
+
+	return([names[taxid] for taxid in lineage])
+
+
+
+def get_lineage_names(resolver, taxid):
+	'''
+	I return the list of lineage names of a taxid: from the memo, then the flat index, then the cache, then ete3.
+	With a flat index, ete3 is not queried: I return None for a taxid missing from the index and the cache.
+	'''
+
+	taxid = int(taxid)
+	if taxid in resolver["memo"]:
+		names = resolver["memo"][taxid]
+		return(list(names) if names is not None else None)
+
+	names = None
+	if resolver["index"] is not None:
+		names = flat_lineage_names(resolver["index"], taxid)
+	if names is None and resolver["cache"] is not None:
+		row = resolver["cache"].execute('SELECT names FROM lineage WHERE taxid = ?', (taxid,)).fetchone()
+		if row is not None:
+			names = row[0].split('\t')
+
+	if names is None and resolver["index"] is not None:
+		resolver["memo"][taxid] = None
+		return(None)
+
+	if names is None:
+		names = ete3_lineage_names(get_ncbi(resolver), taxid)
+		if resolver["cache"] is not None and not resolver["read_only"]:
+			resolver["cache"].execute('INSERT OR REPLACE INTO lineage VALUES (?, ?)', (taxid, '\t'.join(names)))
+			resolver["pending"] += 1
+			if resolver["pending"] >= 10000:
+				resolver["cache"].commit()
+				resolver["pending"] = 0
+
+	resolver["memo"][taxid] = tuple(names)
+
+	return(list(names))
+
+
+
+def default_ete3_db():
+	'''
+	I return the path of the ete3 taxonomy database (~/.etetoolkit/taxa.sqlite).
+	'''
+
+	return(os.path.join(os.environ.get('HOME', ''), '.etetoolkit', 'taxa.sqlite'))
+
+
+
+def build_cache(cache_path, ete3_db = None):
+	'''
+	I fill the SQLite lineage cache with every taxid of the ete3 taxonomy database, merged taxids included.
+	I read the ete3 database directly, ete3 itself is not needed.
+	I return the number of lineages written.
+	'''
+
+	if ete3_db is None:
+		ete3_db = default_ete3_db()
+	db = sqlite3.connect(ete3_db)
+
+	# scientific names and tracks (taxid,parent,...,root) of all the taxids
+	names = {}
+	for taxid, spname in db.execute('SELECT taxid, spname FROM species'):
+		names[taxid] = spname
+
+	cache = open_cache(cache_path)
+	n = 0
+	batch = []
+	lineages = {}
+	for taxid, track in db.execute('SELECT taxid, track FROM species'):
+		lineage = '\t'.join([names[int(x)] for x in reversed(track.split(','))])
+		lineages[taxid] = lineage
+		batch.append((taxid, lineage))
+		if len(batch) >= 100000:
+			cache.executemany('INSERT OR REPLACE INTO lineage VALUES (?, ?)', batch)
+			n += len(batch)
+			batch = []
+
+	# merged taxids get the lineage of the taxid they were merged into
+	for taxid_old, taxid_new in db.execute('SELECT taxid_old, taxid_new FROM merged'):
+		if taxid_new in lineages:
+			batch.append((taxid_old, lineages[taxid_new]))
+
+	cache.executemany('INSERT OR REPLACE INTO lineage VALUES (?, ?)', batch)
+	n += len(batch)
+	cache.commit()
+	cache.close()
+	db.close()
+
+	return(n)
+
+
+
+def read_dmp(dmp):
+	'''
+	I yield the fields of a NCBI taxdump .dmp file.
+	'''
+
+	with open(dmp) as infile:
+		for line in infile:
+			yield(line.rstrip('\t|\n').split('\t|\t'))
+
+
+
+def build_flat_index(source, index_dir):
+	'''
+	I compile the NCBI taxonomy into a flat index in index_dir:
+	parent.npy, rank.npy, depth.npy and canonical.npy (int32 arrays indexed by taxid, -1 if absent),
+	ranks.txt (rank names of the rank codes), names.bin and name_offsets.npy (string table of the scientific names).
+	The source is a taxdump directory (nodes.dmp, names.dmp, merged.dmp) or the ete3 taxa.sqlite.
+	I return the number of taxids.
+	'''
+
+	parents = {}
+	ranks = {}
+	names = {}
+	merged = {}
+	if os.path.isdir(source):
+		for fields in read_dmp(os.path.join(source, 'nodes.dmp')):
+			parents[int(fields[0])] = int(fields[1])
+			ranks[int(fields[0])] = fields[2]
+		for fields in read_dmp(os.path.join(source, 'names.dmp')):
+			if fields[3] == 'scientific name':
+				names[int(fields[0])] = fields[1]
+		if os.path.exists(os.path.join(source, 'merged.dmp')):
+			for fields in read_dmp(os.path.join(source, 'merged.dmp')):
+				merged[int(fields[0])] = int(fields[1])
+	else:
+		db = sqlite3.connect(source)
+		for taxid, parent, spname, rank in db.execute('SELECT taxid, parent, spname, rank FROM species'):
+			parents[taxid] = parent
+			ranks[taxid] = rank
+			names[taxid] = spname
+		for taxid_old, taxid_new in db.execute('SELECT taxid_old, taxid_new FROM merged'):
+			merged[taxid_old] = taxid_new
+		db.close()
+
+	size = max(list(parents) + list(merged)) + 1
+	parent = numpy.full(size, -1, dtype = numpy.int32)
+	rank = numpy.full(size, -1, dtype = numpy.int16)
+	canonical = numpy.full(size, -1, dtype = numpy.int32)
+	rank_names = sorted(set(ranks.values()))
+	rank_codes = dict((rank_names[k], k) for k in range(len(rank_names)))
+	for taxid in parents:
+		parent[taxid] = parents[taxid]
+		rank[taxid] = rank_codes[ranks[taxid]]
+		canonical[taxid] = taxid
+	for taxid_old in merged:
+		if merged[taxid_old] in parents:
+			canonical[taxid_old] = merged[taxid_old]
+
+	# string table: the name of taxid t is names.bin[name_offsets[t]:name_offsets[t + 1]]
+	name_offsets = numpy.zeros(size + 1, dtype = numpy.int64)
+	os.makedirs(index_dir, exist_ok = True)
+	with open(os.path.join(index_dir, 'names.bin'), 'wb') as outfile:
+		offset = 0
+		for taxid in range(size):
+			name_offsets[taxid] = offset
+			if taxid in names:
+				name = names[taxid].encode()
+				outfile.write(name)
+				offset += len(name)
+		name_offsets[size] = offset
+
+	numpy.save(os.path.join(index_dir, 'parent.npy'), parent)
+	numpy.save(os.path.join(index_dir, 'rank.npy'), rank)
+	numpy.save(os.path.join(index_dir, 'canonical.npy'), canonical)
+	numpy.save(os.path.join(index_dir, 'depth.npy'), compute_depth(parent))
+	numpy.save(os.path.join(index_dir, 'name_offsets.npy'), name_offsets)
+	with open(os.path.join(index_dir, 'ranks.txt'), 'w') as outfile:
+		for rank_name in rank_names:
+			outfile.write(rank_name + '\n')
+
+	return(len(parents))
+
+
+
+def compute_depth(parent):
+	'''
+	I return the depth of every taxid (root = 0, -1 if absent), one tree level per numpy pass.
+	'''
+
+	parent = numpy.asarray(parent)
+	depth = numpy.full(len(parent), -1, dtype = numpy.int32)
+	taxids = numpy.arange(len(parent))
+	depth[parent == taxids] = 0
+	todo = numpy.flatnonzero((parent >= 0) & (depth < 0))
+	while len(todo) > 0:
+		ready = depth[parent[todo]] >= 0
+		if not ready.any():
+			raise ValueError("the taxonomy has taxids not connected to the root")
+		depth[todo[ready]] = depth[parent[todo[ready]]] + 1
+		todo = todo[~ready]
+
+	return(depth)
+
+
+
+def load_flat_index(index_dir):
+	'''
+	I memory-map the flat index built by build_flat_index.
+	'''
+
+	index = {}
+	for array in ('parent', 'rank', 'canonical', 'name_offsets'):
+		index[array] = numpy.load(os.path.join(index_dir, array + '.npy'), mmap_mode = 'r')
+	# indexes built before depth.npy was added
+	if os.path.exists(os.path.join(index_dir, 'depth.npy')):
+		index["depth"] = numpy.load(os.path.join(index_dir, 'depth.npy'), mmap_mode = 'r')
+	else:
+		index["depth"] = compute_depth(index["parent"])
+	with open(os.path.join(index_dir, 'ranks.txt')) as infile:
+		index["ranks"] = [line.rstrip('\n') for line in infile]
+	with open(os.path.join(index_dir, 'names.bin'), 'rb') as infile:
+		if os.path.getsize(os.path.join(index_dir, 'names.bin')) > 0:
+			index["names"] = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+		else:
+			index["names"] = b''
+
+	return(index)
+
+
+
+def flat_taxid(index, taxid):
+	'''
+	I return the current taxid of a (possibly merged) taxid, or -1 if it is not in the index.
+	'''
+
+	if taxid < 0 or taxid >= len(index["canonical"]):
+		return(-1)
+
+	return(int(index["canonical"][taxid]))
+
+
+
+def flat_name(index, taxid):
+	'''
+	I return the scientific name of a taxid from the string table.
+	'''
+
+	return(index["names"][int(index["name_offsets"][taxid]):int(index["name_offsets"][taxid + 1])].decode())
+
+
+
+def flat_lineage(index, taxid):
+	'''
+	I return the lineage (list of taxids from the root) of a taxid, or None if it is not in the index.
+	'''
+
+	taxid = flat_taxid(index, taxid)
+	if taxid < 0:
+		return(None)
+
+	lineage = [taxid]
+	parent = index["parent"]
+	while int(parent[taxid]) != taxid:
+		taxid = int(parent[taxid])
+		lineage.append(taxid)
+	lineage.reverse()
+
+	return(lineage)
+
+
+
+def flat_lineage_names(index, taxid):
+	'''
+	I return the lineage names of a taxid from the flat index, or None if it is not in the index.
+	'''
+
+	lineage = flat_lineage(index, taxid)
+	if lineage is None:
+		return(None)
+
+	return([flat_name(index, taxid) for taxid in lineage])
+
+
+
+def flat_lca_pair(index, taxid_a, taxid_b):
+	'''
+	I return the lowest common ancestor of two current taxids:
+	the deeper one climbs to the depth of the other, then both climb together.
+	'''
+
+	parent = index["parent"]
+	depth = index["depth"]
+	depth_a = int(depth[taxid_a])
+	depth_b = int(depth[taxid_b])
+	while depth_a > depth_b:
+		taxid_a = int(parent[taxid_a])
+		depth_a -= 1
+	while depth_b > depth_a:
+		taxid_b = int(parent[taxid_b])
+		depth_b -= 1
+	while taxid_a != taxid_b:
+		taxid_a = int(parent[taxid_a])
+		taxid_b = int(parent[taxid_b])
+
+	return(taxid_a)
+
+
+
+def flat_lca(index, taxids):
+	'''
+	I return the lowest common ancestor of a list of (possibly merged) taxids,
+	the taxids not in the index are ignored. I return -1 if none is in the index.
+	'''
+
+	lca = -1
+	for taxid in taxids:
+		taxid = flat_taxid(index, int(taxid))
+		if taxid < 0:
+			continue
+		if lca < 0:
+			lca = taxid
+		elif lca != taxid:
+			lca = flat_lca_pair(index, lca, taxid)
+		# nothing is above the root
+		if lca >= 0 and int(index["depth"][lca]) == 0:
+			break
+
+	return(lca)
+
+
+
+def flat_rank_names(index, taxid, ranks = RANKS):
+	'''
+	I return the names of the lineage of a taxid at the given ranks ("NA" for the missing ranks),
+	or None if the taxid is not in the index.
+	'''
+
+	lineage = flat_lineage(index, taxid)
+	if lineage is None:
+		return(None)
+
+	by_rank = {}
+	for taxid in lineage:
+		by_rank[index["ranks"][int(index["rank"][taxid])]] = taxid
+
+	return([flat_name(index, by_rank[rank]) if rank in by_rank else "NA" for rank in ranks])